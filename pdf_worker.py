@@ -0,0 +1,21 @@
+"""
+Per-process PDF table extraction for procore-dashboard.py's page pool.
+
+The pool starts its workers with spawn / forkserver rather than forking the
+multithreaded Streamlit server, so the worker functions have to live in a
+module the fresh interpreter can import by name.
+"""
+import io
+
+import pdfplumber
+
+_doc = None
+
+
+def open_pdf(data):
+    global _doc
+    _doc = pdfplumber.open(io.BytesIO(data))
+
+
+def extract_pages(indices):
+    return [_doc.pages[i].extract_table() for i in indices]
@@ -1,10 +1,21 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import io
+import json
+import multiprocessing
+import os
 import re
+import threading
+import unicodedata
+import zipfile
+from xml.etree import ElementTree
 
 try:
     import openpyxl
@@ -13,9 +24,19 @@ except ImportError:
 
 try:
     import pdfplumber
+    from pdfminer.pdftypes import PDFObjRef, PDFStream
 except ImportError:
     pdfplumber = None
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa = None
+
 # ============================================================
 # PAGE CONFIG & LIGHT THEME
 # ============================================================
@@ -128,37 +149,372 @@ EMPLOYEE_COMPANY_MAP = {
 }
 
 
-def extract_companies_from_names(cell_value):
-    if pd.isna(cell_value) or str(cell_value).strip() == "":
-        return "Unknown"
-    text = str(cell_value)
-    companies = set()
-    parts = re.split(r'[,\n]+', text)
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-        match = re.search(r'\(([^)]+)\)', part)
-        if match:
-            companies.add(match.group(1).strip())
-            continue
-        clean_name = re.sub(r'\([^)]*\)', '', part).strip().lower()
-        if clean_name in EMPLOYEE_COMPANY_MAP:
-            companies.add(EMPLOYEE_COMPANY_MAP[clean_name])
-        else:
-            found = False
-            for emp_name, company in EMPLOYEE_COMPANY_MAP.items():
-                if emp_name in clean_name or clean_name in emp_name:
-                    companies.add(company)
-                    found = True
-                    break
-            if not found and clean_name:
-                companies.add("Unknown")
-    if not companies:
-        return "Unknown"
-    if len(companies) > 1:
-        companies.discard("Unknown")
-    return ", ".join(sorted(companies))
+class EmployeeMatcher:
+    """
+    Substring lookup over directory names, built once per directory.
+    match(name) returns the company of the first employee (in directory order)
+    whose name occurs in `name` or contains it — the same answer as a linear scan.
+    """
+
+    def __init__(self, employee_map):
+        names = list(employee_map)
+        self._companies = list(employee_map.values())
+        # Names contained in the query: Aho-Corasick automaton where each state
+        # keeps the lowest pattern index ending there (via failure links too).
+        self._goto = [{}]
+        self._first = [len(names)]
+        for idx, name in enumerate(names):
+            state = 0
+            for ch in name:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._first.append(len(names))
+                state = nxt
+            self._first[state] = min(self._first[state], idx)
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._first[nxt] = min(self._first[nxt], self._first[self._fail[nxt]])
+                queue.append(nxt)
+        # Names containing the query: trigram postings (ascending employee index)
+        # narrow the candidates; queries shorter than a trigram scan one joined
+        # haystack, where the first hit belongs to the earliest employee.
+        self._names = names
+        self._trigrams = {}
+        for idx, name in enumerate(names):
+            for gram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                self._trigrams.setdefault(gram, []).append(idx)
+        self._haystack = "\n".join(names)
+        self._offsets = np.cumsum([0] + [len(n) + 1 for n in names])
+
+    def _first_contained(self, text):
+        best = self._first[0]
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            best = min(best, self._first[state])
+            if best == 0:
+                break
+        return best
+
+    def _first_containing(self, text, limit):
+        if len(text) < 3:
+            pos = self._haystack.find(text) if "\n" not in text else -1
+            if pos < 0:
+                return limit
+            return min(limit, int(np.searchsorted(self._offsets, pos, side="right")) - 1)
+        postings = None
+        for i in range(len(text) - 2):
+            candidates = self._trigrams.get(text[i:i + 3])
+            if candidates is None:
+                return limit
+            if postings is None or len(candidates) < len(postings):
+                postings = candidates
+        for idx in postings:
+            if idx >= limit:
+                break
+            if text in self._names[idx]:
+                return idx
+        return limit
+
+    def match(self, name):
+        idx = self._first_containing(name, self._first_contained(name))
+        return self._companies[idx] if idx < len(self._companies) else None
+
+
+def normalize_person_name(name):
+    """Accent-, case- and punctuation-insensitive form: 'André-Pierre  Ghys' → 'andre pierre ghys'."""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text).split())
+
+
+FUZZY_MAX_DISTANCE = 2
+FUZZY_MIN_LENGTH = 5
+
+
+def bounded_edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class FuzzyNameIndex:
+    """
+    Typo-tolerant lookup over normalized names. Padded trigram postings give the
+    candidates (q-gram count filter), then a bounded edit distance confirms them.
+    Names shorter than FUZZY_MIN_LENGTH are never fuzzy-matched.
+    """
+
+    def __init__(self, names):
+        self._names = list(names)
+        self._lengths = np.array([len(n) for n in self._names])
+        postings = {}
+        for idx, name in enumerate(self._names):
+            for gram in self._grams(name):
+                postings.setdefault(gram, []).append(idx)
+        self._trigrams = {gram: np.array(ids) for gram, ids in postings.items()}
+
+    @staticmethod
+    def _grams(name):
+        padded = f"  {name}  "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def lookup(self, name):
+        if len(name) < FUZZY_MIN_LENGTH or not self._names:
+            return None
+        limit = 1 if len(name) < 10 else FUZZY_MAX_DISTANCE
+        grams = self._grams(name)
+        hits = [self._trigrams[g] for g in grams if g in self._trigrams]
+        if not hits:
+            return None
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._names))
+        # Each edit destroys at most three trigrams; lengths differ by at most `limit`.
+        needed = max(1, len(grams) - 3 * limit)
+        candidates = np.flatnonzero((shared >= needed) & (np.abs(self._lengths - len(name)) <= limit))
+        best = None
+        for idx in candidates:
+            dist = bounded_edit_distance(name, self._names[idx], limit)
+            if dist <= limit and (best is None or dist < best[1]):
+                best = (self._names[idx], dist)
+        return best[0] if best else None
+
+
+class EmployeeDirectory:
+    """Indexed employee → company lookups: exact names, normalized names, substrings and typos."""
+
+    def __init__(self, employee_map, version):
+        self.version = version
+        self.exact = {str(k).strip().lower(): v for k, v in employee_map.items()}
+        self.normalized = {}
+        for name, company in self.exact.items():
+            self.normalized.setdefault(normalize_person_name(name), company)
+        self.matcher = EmployeeMatcher(self.exact)
+        self.fuzzy = FuzzyNameIndex(self.normalized)
+        # Per distinct string: normalized query → matched directory name (or None).
+        self.fuzzy_cache = {}
+        self._fuzzy_lock = threading.Lock()
+
+    def fuzzy_match(self, clean_name):
+        key = normalize_person_name(clean_name)
+        with self._fuzzy_lock:
+            if key in self.fuzzy_cache:
+                return self.fuzzy_cache[key]
+        matched = self.fuzzy.lookup(key)
+        with self._fuzzy_lock:
+            self.fuzzy_cache[key] = matched
+        return matched
+
+    def __len__(self):
+        return len(self.exact)
+
+
+# ============================================================
+# EMPLOYEE DIRECTORY FILE — hot-reloaded on mtime change
+# ============================================================
+EMPLOYEE_DIRECTORY_PATH = os.environ.get(
+    "PROCORE_EMPLOYEE_DIRECTORY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "employee_directory.csv"),
+)
+
+
+def read_employee_directory(path):
+    """
+    Read a name → company map from CSV, JSON or Parquet.
+    Tables need 'name' and 'company' columns (else the first two columns are used);
+    JSON may also be a plain {"name": "company"} object.
+    """
+    lower = path.lower()
+    if lower.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        if isinstance(raw, dict):
+            return {k: v for k, v in raw.items() if v is not None}
+        table = pd.DataFrame(raw)
+    elif lower.endswith(".parquet"):
+        table = pd.read_parquet(path)
+    else:
+        table = pd.read_csv(path, dtype=str)
+    cols = {str(c).strip().lower(): c for c in table.columns}
+    name_col = cols.get("name", cols.get("employee", table.columns[0]))
+    company_col = cols.get("company", table.columns[1])
+    table = table[[name_col, company_col]].dropna()
+    return dict(zip(table[name_col].astype(str), table[company_col].astype(str).str.strip()))
+
+
+@st.cache_resource(max_entries=2)
+def build_employee_directory(path, mtime_ns):
+    return EmployeeDirectory(read_employee_directory(path), version=f"{path}@{mtime_ns}")
+
+
+@st.cache_resource
+def build_builtin_directory(employee_items):
+    digest = hashlib.sha256(repr(employee_items).encode()).hexdigest()[:12]
+    return EmployeeDirectory(dict(employee_items), version=f"builtin@{digest}")
+
+
+def load_employee_directory():
+    """
+    Current directory. The file is only re-read when its mtime changes; without a
+    file (or if it fails to load) the built-in EMPLOYEE_COMPANY_MAP is used.
+    """
+    try:
+        mtime_ns = os.stat(EMPLOYEE_DIRECTORY_PATH).st_mtime_ns
+        return build_employee_directory(EMPLOYEE_DIRECTORY_PATH, mtime_ns)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        st.sidebar.warning(f"⚠️ Employee directory not loaded ({e}); using built-in map")
+    return build_builtin_directory(tuple(EMPLOYEE_COMPANY_MAP.items()))
+
+
+def extract_companies_vectorized(series, directory=None, fuzzy=False):
+    """
+    Name cells → "A, B" sorted company strings, "Unknown" when nothing resolves.
+    Cells are split and exploded into one row per name, parenthesized companies
+    are extracted, exact and normalized names are joined against the employee
+    directory and only the remaining distinct names go through the substring
+    matcher (and, when fuzzy is set, the typo-tolerant index). With pyarrow
+    installed the string ops run on Arrow-backed strings.
+    """
+    directory = directory or load_employee_directory()
+    codes, cells = pd.factorize(series)
+    if len(cells) < len(series):
+        # Name cells repeat heavily, so split and join each distinct cell once.
+        resolved = extract_companies_vectorized(pd.Series(cells, dtype=object), directory, fuzzy).to_numpy()
+        return pd.Series(np.append(resolved, "Unknown")[codes], index=series.index)
+    joined = np.full(len(series), "Unknown", dtype=object)
+    values = series.reset_index(drop=True)
+    values = values[values.notna()].astype(str)
+    if pa is not None:
+        values = values.astype(pd.ArrowDtype(pa.string()))
+    if values.empty:
+        return pd.Series(joined, index=series.index)
+
+    parts = values.str.replace("\n", ",", regex=False).str.split(",").explode().str.strip()
+    keep = (parts.notna() & (parts != "")).to_numpy()
+    row_ids = parts.index.to_numpy()[keep]
+    part_codes, distinct = pd.factorize(parts[keep])
+
+    # Resolve each distinct name once, then broadcast back through the codes.
+    distinct = pd.Series(distinct)
+    company = distinct.str.extract(r"\((?P<company>[^)]+)\)", expand=False).str.strip().astype(object)
+    clean = distinct.str.replace(r"\([^)]*\)", "", regex=True).str.strip().str.lower().astype(object)
+    need = company.isna()
+    company[need] = clean[need].map(directory.exact)
+    need = company.isna()
+    company[need] = clean[need].map(normalize_person_name).map(directory.normalized)
+    for i in np.flatnonzero(company.isna().to_numpy()):
+        matched = directory.matcher.match(clean.iat[i])
+        if matched is None and fuzzy:
+            fuzzy_name = directory.fuzzy_match(clean.iat[i])
+            matched = directory.normalized[fuzzy_name] if fuzzy_name else None
+        if matched is None and clean.iat[i]:
+            matched = "Unknown"
+        company.iat[i] = matched
+
+    # Company codes follow sorted order, so sorting (row, code) pairs sorts names too.
+    company_codes, company_names = pd.factorize(company, sort=True)
+    pair_codes = company_codes[part_codes]
+    row_ids, pair_codes = row_ids[pair_codes >= 0], pair_codes[pair_codes >= 0]
+    if len(row_ids) == 0:
+        return pd.Series(joined, index=series.index)
+    width = len(company_names)
+    pairs = np.sort(row_ids * width + pair_codes)
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+    row_ids, pair_codes = pairs // width, pairs % width
+    if "Unknown" in company_names:
+        per_row = np.bincount(row_ids)
+        drop = (pair_codes == company_names.get_loc("Unknown")) & (per_row[row_ids] > 1)
+        row_ids, pair_codes = row_ids[~drop], pair_codes[~drop]
+
+    # Reassemble "A, B" strings one rank at a time instead of a per-row join.
+    rank = np.arange(len(row_ids)) - np.searchsorted(row_ids, row_ids)
+    names = np.asarray(company_names, dtype=object)[pair_codes]
+    first = rank == 0
+    joined[row_ids[first]] = names[first]
+    for r in range(1, int(rank.max()) + 1):
+        at_rank = rank == r
+        ids = row_ids[at_rank]
+        joined[ids] = joined[ids] + ", " + names[at_rank]
+    return pd.Series(joined, index=series.index)
+
+
+# Name-cell → company memo shared by every session, rerun and frame. Columns are
+# factorized so only cells never seen before reach the extractor; the memo is
+# dropped whenever the employee directory version changes.
+COMPANY_MEMO_MAX_ENTRIES = 500_000
+
+
+class CompanyMemo:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._resolved = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def resolve(self, series, directory, fuzzy=False):
+        version = (directory.version, fuzzy)
+        codes, uniques = pd.factorize(series)
+        with self._lock:
+            if self._version != version:
+                self._resolved.clear()
+                self._version = version
+            known = {u: self._resolved[u] for u in uniques if u in self._resolved}
+        missing = [u for u in uniques if u not in known]
+        if missing:
+            extracted = extract_companies_vectorized(pd.Series(missing, dtype=object), directory, fuzzy)
+            fresh = dict(zip(missing, extracted.to_numpy()))
+            known.update(fresh)
+            with self._lock:
+                # Skip the store if another session reloaded the directory meanwhile.
+                if self._version == version:
+                    if len(self._resolved) + len(fresh) > self.max_entries:
+                        self._resolved.clear()
+                    self._resolved.update(fresh)
+        # Code -1 (missing cell) lands on the trailing "Unknown".
+        resolved = np.array([known[u] for u in uniques] + ["Unknown"], dtype=object)
+        return pd.Series(resolved[codes], index=series.index)
+
+
+@st.cache_resource
+def get_company_memo():
+    return CompanyMemo(COMPANY_MEMO_MAX_ENTRIES)
+
+
+def resolve_companies(series, directory=None, fuzzy=False):
+    return get_company_memo().resolve(series, directory or load_employee_directory(), fuzzy)
+
+
+def fuzzy_matches_in(series, directory):
+    """Name → matched directory name for the fuzzy hits among a column's distinct cells."""
+    hits = {}
+    for cell in pd.unique(series.dropna()):
+        for part in re.split(r'[,\n]+', str(cell)):
+            clean_name = re.sub(r'\([^)]*\)', '', part).strip().lower()
+            matched = directory.fuzzy_cache.get(normalize_person_name(clean_name)) if clean_name else None
+            if matched:
+                hits[part.strip()] = f"{matched} ({directory.normalized[matched]})"
+    return hits
 
 
 # ============================================================
@@ -228,6 +584,13 @@ RFI_COL_MAP = {
 }
 
 
+# Employee-name columns Contractor can be derived from, in priority order, and
+# keywords that mark any other name-bearing column.
+CONTRACTOR_SOURCE_COLUMNS = ["Ball in Court", "Received From", "Assigned To", "Reviewer",
+                             "Distributed To", "Submitted By", "Created By", "Approver", "RFI Manager"]
+NAME_COLUMN_KEYWORDS = ["name", "responsible", "assigned", "contact", "person"]
+
+
 def map_columns(df, col_map):
     rename_dict = {}
     for col in df.columns:
@@ -254,75 +617,569 @@ KNOWN_OPEN_STATUSES = {
 }
 
 
-def classify_statuses(df):
+# Site-specific workflow statuses are pinned in a rules file (hot-reloaded on
+# mtime change): {"exact": {...}, "prefix": {...}, "regex": {...}}, each mapping
+# a pattern to "open" or "closed". Rules win over the built-in sets above;
+# statuses nothing matches fall back to the Date Closed heuristic.
+STATUS_RULES_PATH = os.environ.get(
+    "PROCORE_STATUS_RULES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "status_rules.json"),
+)
+
+
+class StatusRules:
+    """
+    Compiled status rules. Exact names are a dict lookup and prefixes (case-insensitive,
+    longest first) one compiled alternation whose matching group names the rule.
+    Regexes are user-written, so each is compiled on its own (backreferences and
+    group names stay local to the rule) and searched case-insensitively in file
+    order. Statuses are classified once per distinct value, so the loop is cheap.
+    """
+
+    def __init__(self, rules, version):
+        self.version = version
+        for kind in (kind for section in rules.values() for kind in section.values()):
+            if kind not in ("open", "closed"):
+                raise ValueError(f"status rules must map to 'open' or 'closed', not {kind!r}")
+        self.exact = {str(k).strip(): v for k, v in rules.get("exact", {}).items()}
+        prefixes = sorted(rules.get("prefix", {}).items(), key=lambda kv: -len(kv[0].strip()))
+        self._prefix_kinds = [kind for _, kind in prefixes]
+        self._prefix = re.compile(
+            "|".join(f"(?P<r{i}>{re.escape(p.strip())})" for i, (p, _) in enumerate(prefixes)), re.IGNORECASE
+        ) if prefixes else None
+        self._regexes = []
+        for pattern, kind in rules.get("regex", {}).items():
+            try:
+                self._regexes.append((re.compile(pattern, re.IGNORECASE), kind))
+            except re.error as e:
+                raise ValueError(f"status rule regex {pattern!r}: {e}") from None
+
+    def classify(self, status):
+        """"open", "closed", or None when no rule matches."""
+        text = str(status).strip()
+        if text in self.exact:
+            return self.exact[text]
+        m = self._prefix.match(text) if self._prefix is not None else None
+        if m:
+            return self._prefix_kinds[int(m.lastgroup[1:])]
+        for pattern, kind in self._regexes:
+            if pattern.search(text):
+                return kind
+        return None
+
+
+@st.cache_resource(max_entries=2)
+def build_status_rules(path, mtime_ns):
+    with open(path, encoding="utf-8") as f:
+        return StatusRules(json.load(f), version=f"{path}@{mtime_ns}")
+
+
+def load_status_rules():
+    """Current rules; empty when there is no rules file (or it fails to load)."""
+    try:
+        mtime_ns = os.stat(STATUS_RULES_PATH).st_mtime_ns
+        return build_status_rules(STATUS_RULES_PATH, mtime_ns)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        st.sidebar.warning(f"⚠️ Status rules not loaded ({e}); using built-in statuses")
+    return StatusRules({}, version="none")
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def classify_vocabulary(statuses, rules_version, _rules=None):
+    """Status vocabulary → ({status: "open" | "closed"} for ruled / known names, [unknown statuses])."""
+    known, unknown = {}, []
+    for s in statuses:
+        kind = _rules.classify(s) if _rules is not None else None
+        s_lower = str(s).strip().lower()
+        if kind is not None:
+            known[s] = kind
+        elif s_lower in KNOWN_CLOSED_STATUSES:
+            known[s] = "closed"
+        elif s_lower in KNOWN_OPEN_STATUSES:
+            known[s] = "open"
+        else:
+            unknown.append(s)
+    return known, unknown
+
+
+def classify_statuses(df, rules=None):
     if "Status" not in df.columns:
         return [], []
+    # One verdict per distinct status (category); callers apply it with isin on the codes.
     all_statuses = df["Status"].dropna().unique()
+    known, unknown = classify_vocabulary(tuple(all_statuses), None if rules is None else rules.version, rules)
+    # Unknown statuses count as closed when most of their items have a Date Closed;
+    # the ratio comes from a single grouped pass over the frame.
+    closed_ratio = {}
+    if unknown and "Date Closed" in df.columns:
+        closed_ratio = df["Date Closed"].notna().groupby(df["Status"], observed=True).mean().to_dict()
     open_list, closed_list = [], []
     for s in all_statuses:
-        s_lower = str(s).strip().lower()
-        if s_lower in KNOWN_CLOSED_STATUSES:
-            closed_list.append(s)
-        elif s_lower in KNOWN_OPEN_STATUSES:
-            open_list.append(s)
-        else:
-            if "Date Closed" in df.columns:
-                mask = df["Status"] == s
-                has_closed = df.loc[mask, "Date Closed"].notna().mean()
-                if has_closed > 0.7:
-                    closed_list.append(s)
-                else:
-                    open_list.append(s)
-            else:
-                open_list.append(s)
+        kind = known.get(s) or ("closed" if closed_ratio.get(s, 0) > 0.7 else "open")
+        (closed_list if kind == "closed" else open_list).append(s)
     return open_list, closed_list
 
 
+# ============================================================
+# PARSE CACHE — keyed by upload content hash, LRU within a memory budget
+# ============================================================
+PARSE_CACHE_MAX_MB = int(os.environ.get("PROCORE_PARSE_CACHE_MB", "512"))
+
+
+class ParseCache:
+    """Process-wide LRU of parsed DataFrames, bounded by their in-memory size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (df, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+
+@st.cache_resource
+def get_parse_cache():
+    return ParseCache(PARSE_CACHE_MAX_MB * 1024 * 1024)
+
+
 # ============================================================
 # FILE PARSER — CSV, Excel, PDF
 # ============================================================
-SUPPORTED_TYPES = ["csv", "xlsx", "xls", "pdf"]
+SUPPORTED_TYPES = ["csv", "xlsx", "xls", "pdf", "parquet", "feather", "arrow"]
+COLUMNAR_TYPES = (".parquet", ".feather", ".arrow")
+DATE_COLUMNS = ["Date Created", "Due Date", "Date Closed"]
 
+# CSVs at least this large are streamed through pyarrow in CSV_CHUNK_MB blocks.
+CSV_STREAM_MIN_MB = float(os.environ.get("PROCORE_CSV_STREAM_MIN_MB", "64"))
+CSV_CHUNK_MB = float(os.environ.get("PROCORE_CSV_CHUNK_MB", "16"))
 
-def parse_uploaded_file(uploaded_file):
-    if uploaded_file is None:
+
+def plan_columns(header, item_type):
+    """
+    Sniffed header → (positions, dtypes) for the columns normalize_columns can use:
+    anything in the column map plus employee-name-bearing columns. Date and
+    Days Open columns get no dtype; dates are parsed later by parse_dates.
+    Returns None when nothing is recognised, so the file is read in full.
+    """
+    col_map = SUBMITTAL_COL_MAP if item_type == "submittal" else RFI_COL_MAP
+    positions, dtypes = [], {}
+    for i, col in enumerate(header):
+        key = str(col).strip().lower()
+        target = col_map.get(key)
+        if target is None and str(col).strip() not in CONTRACTOR_SOURCE_COLUMNS \
+                and not any(kw in key for kw in NAME_COLUMN_KEYWORDS):
+            continue
+        positions.append(i)
+        if target not in DATE_COLUMNS and target != "Days Open":
+            dtypes[col] = str
+    if not any(col_map.get(str(header[i]).strip().lower()) for i in positions):
         return None
+    return positions, dtypes
+
+
+def read_csv_streaming(data, item_type, chunk_bytes, on_progress=None):
+    """
+    Stream a CSV through pyarrow's incremental reader one block at a time. Each
+    batch is projected to the planned columns, typed as strings, blank-to-null'd
+    and renamed to the dashboard's column names as it arrives; the batches are
+    then stitched into one Arrow-backed frame, so the only transient overhead is
+    a single block rather than a second copy of the file.
+    """
+    header = pd.read_csv(io.BytesIO(data), nrows=0).columns
+    plan = plan_columns(header, item_type)
+    positions = range(len(header)) if plan is None else plan[0]
+    columns = [header[i] for i in positions]
+    col_map = SUBMITTAL_COL_MAP if item_type == "submittal" else RFI_COL_MAP
+    _, rename = map_columns(pd.DataFrame(columns=columns), col_map)
+    names = [str(rename.get(col, col)).strip() for col in columns]
+    # Columns are picked by position: pandas de-duplicates repeated headers
+    # ("Contact Name.1") but pyarrow keeps them, so names can't be matched.
+    by_position = [f"column_{i}" for i in range(len(header))]
+    selected = [by_position[i] for i in positions]
+    reader = pa_csv.open_csv(
+        io.BytesIO(data),
+        read_options=pa_csv.ReadOptions(block_size=max(int(chunk_bytes), 1 << 16),
+                                        column_names=by_position, skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=selected,
+            column_types={col: pa.string() for col in selected},
+            strings_can_be_null=True,
+        ),
+    )
+    # Progress is by rows; newlines over-count only for quoted multi-line cells.
+    total_rows = max(data.count(b"\n"), 1)
+    batches, rows = [], 0
+    for batch in reader:
+        arrays = [pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr) for arr in batch.columns]
+        batches.append(pa.RecordBatch.from_arrays(arrays, names=names))
+        rows += batch.num_rows
+        if on_progress is not None:
+            on_progress(min(rows / total_rows, 1.0))
+    schema = pa.schema([pa.field(n, pa.string()) for n in names])
+    return pa.Table.from_batches(batches, schema=schema).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_columnar(data, name, item_type):
+    """
+    Parquet / Feather / Arrow IPC upload → Arrow-backed frame. Only the planned
+    columns are read, so the buffers of the rest are never decompressed (pandas
+    writes Feather lz4-compressed). Text columns are cast to strings as the CSV
+    path reads them; typed dates and numbers are kept as stored.
+    """
+    buf = pa.py_buffer(data)
+    if name.endswith(".parquet"):
+        pf = pa_parquet.ParquetFile(pa.BufferReader(buf))
+        header = pf.schema_arrow.names
+        plan = plan_columns(header, item_type)
+        table = pf.read(columns=None if plan is None else [header[i] for i in plan[0]])
+    else:
+        try:
+            header, stream = pa.ipc.open_file(buf).schema.names, False
+        except pa.ArrowInvalid:
+            header, stream = pa.ipc.open_stream(buf).schema.names, True
+        plan = plan_columns(header, item_type)
+        if stream:
+            options = pa.ipc.IpcReadOptions(included_fields=[] if plan is None else plan[0])
+            table = pa.ipc.open_stream(buf, options=options).read_all()
+        else:
+            table = pa_feather.read_table(pa.BufferReader(buf), columns=None if plan is None else plan[0])
+    if plan is not None:
+        for i, field in enumerate(table.schema):
+            if field.name in plan[1] and not pa.types.is_string(field.type):
+                table = table.set_column(i, field.name, pc.cast(table.column(i), pa.string()))
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def workbook_sheet_names(digest, name, _data):
+    """Sheet names from the workbook manifest alone; no cell data is parsed."""
+    if name.endswith(".xlsx"):
+        with zipfile.ZipFile(io.BytesIO(_data)) as zf:
+            root = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+        return [el.get("name") for el in root.iter() if el.tag.rsplit("}", 1)[-1] == "sheet"]
+    return pd.ExcelFile(io.BytesIO(_data)).sheet_names
+
+
+# read_excel(dtype=str) returns the str dtype on pandas 3 and object on pandas 2;
+# either way blank cells stay NaN.
+EXCEL_TEXT_DTYPE = pd.Series([""], dtype=str).dtype
+
+
+def _excel_cell(value):
+    # Matches pandas' openpyxl reader: whole floats come back as ints.
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def read_xlsx_streaming(data, sheet, item_type):
+    """
+    Reads one sheet row by row through openpyxl's read_only mode, keeping only the
+    planned columns. Returns None when the header needs pandas' own handling
+    (duplicate names), so the caller falls back to read_excel.
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet is not None else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            return pd.DataFrame()
+        header = [f"Unnamed: {i}" if h is None else str(h) for i, h in enumerate(first)]
+        if len(set(header)) != len(header):
+            return None
+        plan = plan_columns(header, item_type)
+        positions, dtypes = (range(len(header)), {}) if plan is None else plan
+        columns = {header[i]: [] for i in positions}
+        targets = list(zip(positions, columns.values()))
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            width = len(row)
+            for i, values in targets:
+                values.append(_excel_cell(row[i]) if i < width else None)
+    finally:
+        wb.close()
+    df = pd.DataFrame({col: pd.Series(values, dtype=object) for col, values in columns.items()})
+    for col in df.columns:
+        if col in dtypes:
+            text = df[col].map(str, na_action="ignore")
+            df[col] = text.where(text.notna(), np.nan).astype(EXCEL_TEXT_DTYPE)
+        else:
+            df[col] = df[col].infer_objects()
+    return df
+
+
+# PDF tables are extracted once per distinct page: results are cached by a hash
+# of each page's content streams and everything they draw through (resources,
+# form XObjects, fonts), so a revised upload only re-extracts the pages that
+# changed. The cache holds JSON-encoded tables under a byte budget. Uncached
+# pages go to a process pool once there are at least PDF_PARALLEL_MIN_PAGES of
+# them; each worker opens the bytes on its own. Workers are started with
+# forkserver (spawn where that is missing), never by forking the threaded
+# server, and results not back within PDF_POOL_TIMEOUT_S are extracted serially
+# instead.
+PDF_WORKERS = int(os.environ.get("PROCORE_PDF_WORKERS", os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_POOL_TIMEOUT_S = float(os.environ.get("PROCORE_PDF_POOL_TIMEOUT_S", "300"))
+PDF_PAGE_CACHE_MAX_MB = float(os.environ.get("PROCORE_PDF_PAGE_CACHE_MB", "64"))
+
+
+class PdfPageCache:
+    """Process-wide LRU of extracted page tables keyed by page digest, bounded in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._tables = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, digest):
+        with self._lock:
+            return digest in self._tables
+
+    def get(self, digest, default=None):
+        with self._lock:
+            if digest not in self._tables:
+                return default
+            self._tables.move_to_end(digest)
+            encoded = self._tables[digest]
+        return json.loads(encoded)
+
+    def put(self, digest, table):
+        encoded = json.dumps(table).encode()
+        with self._lock:
+            if digest in self._tables:
+                self._size -= len(self._tables.pop(digest))
+            self._tables[digest] = encoded
+            self._size += len(encoded)
+            while self._size > self.max_bytes and self._tables:
+                self._size -= len(self._tables.popitem(last=False)[1])
+
+
+@st.cache_resource
+def get_pdf_page_cache():
+    return PdfPageCache(int(PDF_PAGE_CACHE_MAX_MB * 1024 * 1024))
+
+
+def _pdf_object_digest(obj, memo):
+    """
+    Content hash of a PDF object with references resolved: streams by their
+    attributes and decoded bytes, dicts and arrays element by element. memo
+    (object id → digest) shares fonts and XObjects between the pages of one
+    document and cuts reference cycles.
+    """
+    if isinstance(obj, PDFObjRef):
+        if obj.objid not in memo:
+            memo[obj.objid] = b"cycle"
+            memo[obj.objid] = _pdf_object_digest(obj.resolve(), memo)
+        return memo[obj.objid]
+    digest = hashlib.sha256(type(obj).__name__.encode())
+    if isinstance(obj, PDFStream):
+        digest.update(_pdf_object_digest(obj.attrs, memo))
+        digest.update(obj.get_data())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=str):
+            digest.update(repr(key).encode() + _pdf_object_digest(obj[key], memo))
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            digest.update(_pdf_object_digest(value, memo))
+    else:
+        digest.update(repr(obj).encode())
+    return digest.digest()
+
+
+def pdf_page_digest(page, memo):
+    attrs = page.page_obj.attrs
+    return hashlib.sha256(repr(page.bbox).encode() + _pdf_object_digest(
+        [attrs.get("Rotate"), page.page_obj.resources, attrs.get("Contents")], memo)).hexdigest()
+
+
+def _extract_pdf_pages_serially(data, indices):
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for i in indices:
+            yield pdf.pages[i].extract_table()
+
+
+def _extract_pdf_pages_pooled(data, indices, workers):
+    import pdf_worker  # next to this script; spawned workers import it by name
+
+    # A few chunks per worker keeps the pool busy when page costs are uneven.
+    chunks = [c.tolist() for c in np.array_split(indices, min(len(indices), workers * 4))]
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                               initializer=pdf_worker.open_pdf, initargs=(data,))
+    try:
+        for tables in pool.map(pdf_worker.extract_pages, chunks, timeout=PDF_POOL_TIMEOUT_S):
+            yield from tables
+    finally:
+        # Don't wait on a stuck worker; the caller falls back to serial extraction.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_tables(data):
+    """
+    Yields the first table of every page, in page order (None where a page has
+    none). Tables come from the page cache or the extractor one page at a time;
+    only the digests are held for the whole document.
+    """
+    cache = get_pdf_page_cache()
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        memo = {}
+        digests = [pdf_page_digest(page, memo) for page in pdf.pages]
+    missing, seen = [], set()
+    for i, digest in enumerate(digests):
+        if digest not in seen and digest not in cache:
+            missing.append(i)
+        seen.add(digest)
+
+    workers = min(PDF_WORKERS, len(missing))
+    if len(missing) >= PDF_PARALLEL_MIN_PAGES and workers >= 2:
+        extracted = _extract_pdf_pages_pooled(data, missing, workers)
+    else:
+        extracted = _extract_pdf_pages_serially(data, missing)
+
+    done, pending, evicted = 0, set(missing), object()
+    for i, digest in enumerate(digests):
+        if i in pending:
+            try:
+                table = next(extracted)
+            except Exception:
+                # Pool unavailable or timed out: finish the rest serially.
+                extracted = _extract_pdf_pages_serially(data, missing[done:])
+                table = next(extracted)
+            done += 1
+            cache.put(digest, table)
+        else:
+            table = cache.get(digest, evicted)
+            if table is evicted:  # dropped since planning; extract this page on its own
+                table = next(_extract_pdf_pages_serially(data, [i]))
+                cache.put(digest, table)
+        yield table
+
+
+def _pdf_row_key(row):
+    return tuple(str(cell or "").strip().lower() for cell in row)
+
+
+def read_file_bytes(data, name, sheet=None, item_type="submittal", on_progress=None):
+    if name.endswith(".csv") and pa is not None and len(data) >= CSV_STREAM_MIN_MB * 1024 * 1024:
+        df = read_csv_streaming(data, item_type, CSV_CHUNK_MB * 1024 * 1024, on_progress)
+    elif name.endswith(".csv"):
+        plan = plan_columns(pd.read_csv(io.BytesIO(data), nrows=0).columns, item_type)
+        if plan is None:
+            df = pd.read_csv(io.BytesIO(data))
+        else:
+            positions, dtypes = plan
+            df = pd.read_csv(io.BytesIO(data), usecols=positions, dtype=dtypes)
+    elif name.endswith((".xlsx", ".xls")):
+        df = None
+        if name.endswith(".xlsx") and openpyxl is not None:
+            df = read_xlsx_streaming(data, sheet, item_type)
+        if df is None:
+            plan = plan_columns(pd.read_excel(io.BytesIO(data), sheet_name=sheet, nrows=0).columns, item_type)
+            if plan is None:
+                df = pd.read_excel(io.BytesIO(data), sheet_name=sheet)
+            else:
+                # Excel cells are already typed, so only text columns get an explicit dtype.
+                positions, dtypes = plan
+                df = pd.read_excel(io.BytesIO(data), sheet_name=sheet, usecols=positions, dtype=dtypes)
+    elif name.endswith(COLUMNAR_TYPES):
+        df = read_columnar(data, name, item_type)
+    elif name.endswith(".pdf"):
+        # One frame per page; header rows repeated on later pages are dropped.
+        header, frames = None, []
+        for table in extract_pdf_tables(data):
+            if not table:
+                continue
+            if header is None:
+                header, table = table[0], table[1:]
+                header_key = _pdf_row_key(header)
+            width = len(header)
+            rows = [list(row[:width]) + [None] * (width - len(row))
+                    for row in table if _pdf_row_key(row) != header_key]
+            if rows:
+                frames.append(pd.DataFrame(rows))
+        if header is None:
+            return None
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=range(len(header)))
+        df.columns = pd.Index(header)
+    else:
+        return None
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def parse_uploaded_file(uploaded_file, item_type="submittal"):
+    """
+    Parse an uploaded export, reusing the result while the bytes are unchanged.
+    Cache key: (sha256 of the upload, sheet name, parser options incl. item type).
+    Returns (df, dataset_key); the frame is shared across reruns — callers must not mutate it.
+    """
+    if uploaded_file is None:
+        return None, None
     name = uploaded_file.name.lower()
+    if not name.endswith(tuple(f".{ext}" for ext in SUPPORTED_TYPES)):
+        st.error(f"Unsupported file type: {uploaded_file.name}")
+        return None, None
+    if name.endswith(".pdf") and pdfplumber is None:
+        st.error("📦 `pdfplumber` required for PDF. Install: `pip install pdfplumber`")
+        return None, None
+    if name.endswith(COLUMNAR_TYPES) and pa is None:
+        st.error("📦 `pyarrow` required for Parquet/Feather/Arrow. Install: `pip install pyarrow`")
+        return None, None
     try:
-        if name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        elif name.endswith((".xlsx", ".xls")):
-            xls = pd.ExcelFile(uploaded_file)
-            if len(xls.sheet_names) > 1:
+        data = uploaded_file.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        sheet = None
+        if name.endswith((".xlsx", ".xls")):
+            sheet_names = workbook_sheet_names(digest, name, data)
+            if len(sheet_names) > 1:
                 sheet = st.selectbox(
                     f"Select sheet from **{uploaded_file.name}**",
-                    xls.sheet_names, key=f"sheet_{uploaded_file.name}"
+                    sheet_names, key=f"sheet_{uploaded_file.name}"
                 )
             else:
-                sheet = xls.sheet_names[0]
-            df = pd.read_excel(xls, sheet_name=sheet)
-        elif name.endswith(".pdf"):
-            if pdfplumber is None:
-                st.error("📦 `pdfplumber` required for PDF. Install: `pip install pdfplumber`")
-                return None
-            all_rows = []
-            with pdfplumber.open(io.BytesIO(uploaded_file.read())) as pdf:
-                for page in pdf.pages:
-                    table = page.extract_table()
-                    if table:
-                        all_rows.extend(table)
-            if not all_rows:
+                sheet = sheet_names[0]
+        options = (name.rsplit(".", 1)[-1], item_type)
+        key = (digest, sheet, options)
+        cache = get_parse_cache()
+        df = cache.get(key)
+        if df is None:
+            progress = st.progress(0.0, text=f"Reading {uploaded_file.name}…")
+            df = read_file_bytes(data, name, sheet, item_type,
+                                 on_progress=lambda f: progress.progress(f, text=f"Reading {uploaded_file.name}…"))
+            progress.empty()
+            if df is None:
                 st.warning("⚠️ No tables found in the PDF file.")
-                return None
-            df = pd.DataFrame(all_rows[1:], columns=all_rows[0])
-        else:
-            st.error(f"Unsupported file type: {uploaded_file.name}")
-            return None
-        df.columns = df.columns.str.strip()
-        return df
+                return None, None
+            cache.put(key, df)
+        return df, hashlib.sha256(repr(key).encode()).hexdigest()
     except Exception as e:
         st.error(f"❌ Error reading **{uploaded_file.name}**: {e}")
-        return None
+        return None, None
 
 
 # ============================================================
@@ -330,9 +1187,10 @@ def parse_uploaded_file(uploaded_file):
 # ============================================================
 def derive_contractor_column(df):
     """
-    Derive 'Contractor' (company) from employee name columns.
+    Pick the employee name column that 'Contractor' (company) is derived from.
     Priority: Ball in Court > Received From > Assigned To > other name cols.
-    Preserves original names in 'Employee(s)' column for table display.
+    Preserves original names in 'Employee(s)' column for table display; the
+    companies are filled in by resolve_company_columns.
     """
     if "Contractor" in df.columns:
         sample = df["Contractor"].dropna().head(20).str.strip().str.lower()
@@ -340,11 +1198,8 @@ def derive_contractor_column(df):
         if any(any(k in s for k in known) for s in sample):
             return df
 
-    priority_cols = ["Ball in Court", "Received From", "Assigned To", "Reviewer",
-                     "Distributed To", "Submitted By", "Created By", "Approver", "RFI Manager"]
-
     source_col = None
-    for col in priority_cols:
+    for col in CONTRACTOR_SOURCE_COLUMNS:
         if col in df.columns and df[col].notna().any():
             source_col = col
             break
@@ -352,14 +1207,14 @@ def derive_contractor_column(df):
     if source_col is None:
         for col in df.columns:
             cl = col.lower()
-            if any(kw in cl for kw in ["name", "responsible", "assigned", "contact", "person"]):
+            if any(kw in cl for kw in NAME_COLUMN_KEYWORDS):
                 if df[col].notna().any():
                     source_col = col
                     break
 
     if source_col:
         df["Employee(s)"] = df[source_col].fillna("").astype(str)
-        df["Contractor"] = df[source_col].apply(extract_companies_from_names)
+        df["Contractor"] = "Unknown"
         st.sidebar.success(f"✅ Mapped **'{source_col}'** → Contractor")
     elif "Contractor" not in df.columns:
         df["Contractor"] = "Unknown"
@@ -371,15 +1226,71 @@ def derive_contractor_column(df):
 # ============================================================
 # FULL NORMALIZATION
 # ============================================================
+# Low-cardinality label columns are held as categoricals from here on, so filters,
+# groupbys and value_counts run on integer codes. Categoricals keep unused
+# categories: group with observed=True and drop zero counts.
+CATEGORICAL_COLUMNS = ["Status", "Contractor", "Ball in Court", "Discipline", "Priority",
+                       "Cost Impact", "Schedule Impact", "Spec Section"]
+
+
+def as_categoricals(df, columns=CATEGORICAL_COLUMNS):
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+# Candidate formats for parse_dates, most common Procore exports first. Ambiguous
+# day/month dates resolve month-first, as dateutil's per-value parsing does.
+DATE_FORMATS = ["ISO8601", "%m/%d/%Y", "%m/%d/%y", "%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M %p",
+                "%d-%b-%Y", "%d-%b-%y", "%b %d, %Y", "%B %d, %Y", "%d/%m/%Y", "%Y/%m/%d"]
+DATE_SAMPLE_SIZE = 200
+
+
+def parse_dates(values):
+    """
+    Date column → (datetime64 series, rows that needed per-value parsing).
+    Only the distinct strings are parsed: first with whichever of DATE_FORMATS
+    fits most of a sample, then per value for what that format missed.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return pd.to_datetime(values, errors="coerce"), 0
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(np.asarray(uniques, dtype=object)).astype(str).str.strip()
+    present = text != ""
+    sample = text[present].head(DATE_SAMPLE_SIZE)
+    best, best_hits = None, 0
+    for fmt in DATE_FORMATS:
+        hits = pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum()
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+        if hits == len(sample):
+            break
+    if best is None:
+        parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    else:
+        parsed = pd.to_datetime(text, format=best, errors="coerce")
+    slow = parsed.isna() & present
+    if slow.any():
+        parsed[slow] = pd.to_datetime(text[slow], format="mixed", errors="coerce")
+    # codes are -1 for missing values, which picks the trailing NaT.
+    lookup = np.append(parsed.to_numpy(), np.datetime64("NaT"))
+    slow_rows = int(np.append(slow.to_numpy(), False)[codes].sum())
+    return pd.Series(lookup[codes], index=values.index, name=values.name), slow_rows
+
+
 def normalize_columns(df, item_type="submittal"):
+    """Returns (df, slow_dates) — slow_dates counts date cells that no common format fit."""
     col_map = SUBMITTAL_COL_MAP if item_type == "submittal" else RFI_COL_MAP
     df, mapped = map_columns(df, col_map)
 
     df = derive_contractor_column(df)
 
-    for col in ["Date Created", "Due Date", "Date Closed"]:
+    slow_dates = 0
+    for col in DATE_COLUMNS:
         if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+            df[col], slow = parse_dates(df[col])
+            slow_dates += slow
 
     if "Days Open" not in df.columns:
         if "Date Created" in df.columns:
@@ -404,21 +1315,106 @@ def normalize_columns(df, item_type="submittal"):
         if col not in df.columns:
             df[col] = default
 
+    return as_categoricals(df), slow_dates
+
+
+# ============================================================
+# COMPANY RESOLUTION — the only step that reads the employee directory
+# ============================================================
+def resolve_company_columns(df, directory, fuzzy=False):
+    """Returns (df, fuzzy_hits) — fuzzy_hits maps each typo-matched name to its directory entry."""
+    fuzzy_hits = {}
+    if "Employee(s)" in df.columns:
+        df["Contractor"] = resolve_companies(df["Employee(s)"], directory, fuzzy)
+        if fuzzy:
+            fuzzy_hits.update(fuzzy_matches_in(df["Employee(s)"], directory))
+
     # Map Ball in Court to companies — keep original names for table display
     if "Ball in Court" in df.columns:
-        df["Ball in Court (Names)"] = df["Ball in Court"].fillna("").astype(str)
+        df["Ball in Court (Names)"] = df["Ball in Court"].astype(object).fillna("").astype(str)
         sample_bic = df["Ball in Court"].dropna().head(10).str.strip().str.lower()
         standard_bic = {"consultant", "contractor", "owner", "architect", "closed", "unknown", ""}
         if not any(s in standard_bic for s in sample_bic):
-            df["Ball in Court"] = df["Ball in Court (Names)"].apply(extract_companies_from_names)
+            df["Ball in Court"] = resolve_companies(df["Ball in Court (Names)"], directory, fuzzy)
+            if fuzzy:
+                fuzzy_hits.update(fuzzy_matches_in(df["Ball in Court (Names)"], directory))
+
+    return as_categoricals(df, ["Contractor", "Ball in Court"]), fuzzy_hits
+
 
+# ============================================================
+# WORKING-DAY CALENDAR — hot-reloaded on mtime change
+# ============================================================
+HOLIDAY_CALENDAR_PATH = os.environ.get(
+    "PROCORE_HOLIDAYS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "holidays.csv"),
+)
+WORKWEEK = os.environ.get("PROCORE_WORKWEEK", "Mon Tue Wed Thu Fri")
+DAY_BASES = ["Calendar days", "Working days"]
+
+
+@st.cache_resource(max_entries=2)
+def build_business_calendar(path, mtime_ns):
+    table = pd.read_csv(path, dtype=str)
+    holidays = pd.to_datetime(table.iloc[:, 0], errors="coerce").dropna()
+    return np.busdaycalendar(weekmask=WORKWEEK, holidays=holidays.to_numpy().astype("datetime64[D]"))
+
+
+def load_business_calendar():
+    """
+    (calendar, version) for working-day counts. The holiday file (dates in its first
+    column) is only re-read when its mtime changes; without it only weekends are skipped.
+    """
+    try:
+        mtime_ns = os.stat(HOLIDAY_CALENDAR_PATH).st_mtime_ns
+        return build_business_calendar(HOLIDAY_CALENDAR_PATH, mtime_ns), f"{HOLIDAY_CALENDAR_PATH}@{mtime_ns}"
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        st.sidebar.warning(f"⚠️ Holiday calendar not loaded ({e}); counting weekends only")
+    return np.busdaycalendar(weekmask=WORKWEEK), "weekends-only"
+
+
+def count_days(start, end, calendar=None):
+    """
+    Whole days from start to end per row, clipped at 0 and NaN where a date is
+    missing. Counts working days with np.busday_count when a calendar is given.
+    """
+    if calendar is None:
+        return (end - start).dt.days.clip(lower=0)
+    valid = (start.notna() & end.notna()).to_numpy()
+    days = np.full(len(start), np.nan)
+    days[valid] = np.busday_count(start.to_numpy()[valid].astype("datetime64[D]"),
+                                  end.to_numpy()[valid].astype("datetime64[D]"), busdaycal=calendar)
+    return pd.Series(days, index=start.index).clip(lower=0)
+
+
+def apply_day_basis(df, calendar=None):
+    """
+    Working-day basis (calendar given): Days Open is recounted from Date Created,
+    keeping the export's own value where that date is missing. Either basis adds
+    'Days Past Due' — the slippage past Due Date.
+    """
+    now = pd.Timestamp.now()
+    end = df["Date Closed"].fillna(now) if "Date Closed" in df.columns else pd.Series(now, index=df.index)
+    if calendar is not None and "Date Created" in df.columns:
+        df["Days Open"] = count_days(df["Date Created"], end, calendar).fillna(df["Days Open"])
+    if "Due Date" in df.columns:
+        df["Days Past Due"] = count_days(df["Due Date"], end, calendar)
     return df
 
 
 # ============================================================
 # OVERDUE CALCULATION
 # ============================================================
-def calculate_overdue(df, threshold_days, open_statuses):
+# Only the Days Open test depends on the slider, so each item gets the threshold
+# it stays overdue below: +inf when open and past due / flagged by Procore,
+# Days Open when open otherwise, -inf when it can never be overdue.
+# Is Overdue at threshold T is then just "Overdue Above > T".
+OVERDUE_CURVE_MAX_DAYS = 30
+
+
+def add_overdue_horizon(df, open_statuses):
     is_open = df["Status"].isin(open_statuses)
 
     procore_flag = pd.Series(False, index=df.index)
@@ -427,16 +1423,541 @@ def calculate_overdue(df, threshold_days, open_statuses):
             ["yes", "true", "1", "overdue", "y"]
         )
 
-    days_exceed = df["Days Open"] > threshold_days
-
     past_due = pd.Series(False, index=df.index)
     if "Due Date" in df.columns:
         past_due = df["Due Date"].notna() & (df["Due Date"] < pd.Timestamp.now())
 
-    df["Is Overdue"] = is_open & (procore_flag | days_exceed | past_due)
+    days_open = pd.to_numeric(df["Days Open"], errors="coerce").astype(float).fillna(-np.inf)
+    horizon = np.where(procore_flag | past_due, np.inf, days_open)
+    df["Overdue Above"] = np.where(is_open, horizon, -np.inf)
     return df
 
 
+def group_codes(group_frame):
+    """Row → group code over the filter columns, plus one row of labels per group."""
+    grouped = group_frame.astype(object).fillna("").groupby(list(group_frame.columns), sort=False)
+    return grouped.ngroup().to_numpy(), grouped.size().index.to_frame(index=False)
+
+
+def select_groups(groups, **filters):
+    mask = np.ones(len(groups), dtype=bool)
+    for col, values in filters.items():
+        mask &= groups[col].isin(values).to_numpy()
+    return mask
+
+
+class OverdueCurve:
+    """
+    Overdue count for every whole-day threshold 0..max_days, per group of the
+    filter columns: counts[g, T] is the number of items in group g overdue at T.
+    Open and closed item counts per group ride along, so the metric cards are
+    three sums over the selected groups. Built once per dataset; a slider move
+    is an index lookup.
+    """
+
+    def __init__(self, overdue_above, group_frame, is_open=None, is_closed=None, max_days=OVERDUE_CURVE_MAX_DAYS):
+        codes, self.groups = group_codes(group_frame)
+        self.open, self.closed = (np.zeros(len(self.groups), dtype=np.int64) if flags is None else
+                                  np.bincount(codes, weights=flags, minlength=len(self.groups)).astype(np.int64)
+                                  for flags in (is_open, is_closed))
+        self.thresholds = np.arange(max_days + 1)
+        # Integer thresholds T with T < u, i.e. overdue for T <= last; -1 never overdue.
+        last = np.clip(np.ceil(np.nan_to_num(overdue_above, nan=-np.inf)) - 1, -1, max_days).astype(np.int64)
+        width = max_days + 2
+        hist = np.bincount(codes * width + last + 1, minlength=len(self.groups) * width).reshape(-1, width)
+        self.table = hist[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+
+    def select(self, **filters):
+        return select_groups(self.groups, **filters)
+
+    def counts(self, selection):
+        return self.table[selection].sum(axis=0)
+
+    def count(self, threshold, selection):
+        return int(self.table[selection, min(threshold, len(self.thresholds) - 1)].sum())
+
+    def tally(self, threshold, selection):
+        """(open, closed, overdue) over the selected groups."""
+        return int(self.open[selection].sum()), int(self.closed[selection].sum()), self.count(threshold, selection)
+
+    def counts_for_rows(self, overdue_above):
+        """The same curve straight from a row subset, for filters the groups can't express."""
+        ordered = np.sort(overdue_above)
+        return len(ordered) - np.searchsorted(ordered, self.thresholds, side="right")
+
+
+def status_counts(df, open_statuses, closed_statuses):
+    """
+    (open, closed) over the rows of `df`, for selections the per-dataset
+    tallies can't express. One bincount: each Status code maps to open /
+    closed / neither through a per-category table.
+    """
+    status = df["Status"]
+    if isinstance(status.dtype, pd.CategoricalDtype):
+        codes, categories = status.cat.codes.to_numpy(), status.cat.categories
+    else:
+        codes, categories = pd.factorize(status)
+    kind = np.zeros(len(categories) + 1, dtype=np.int64)  # code -1 (missing) → trailing "neither"
+    kind[:-1][categories.isin(closed_statuses)] = 2
+    kind[:-1][categories.isin(open_statuses)] = 1
+    tally = np.bincount(kind[codes], minlength=3)
+    return int(tally[1]), int(tally[2])
+
+
+# ============================================================
+# AS-OF INDEX — open / closed / overdue at any past date
+# ============================================================
+class AsOfIndex:
+    """
+    Sweep-line index over each item's intervals on the day axis: open on
+    [Date Created, Date Closed) and past due on [Due Date, Date Closed).
+    A count at day D is a stabbing query — #starts <= D minus #ends <= D — so
+    it is a pair of binary searches into keys sorted by (filter group, day).
+
+    Items without a Date Closed stay open if their status is open and are never
+    open otherwise. The Days Open test ("older than T days at D") is
+    "created <= cutoff(D, T)"; those items are counted with one more stabbing
+    query plus a scan of the few items whose open-and-not-yet-due interval ends
+    between the cutoff and D. Procore's own overdue flag only describes today,
+    so it is not used here.
+    """
+
+    SPAN = 1 << 31
+    ORIGIN = 1 << 30
+    NEVER = SPAN - 1
+
+    def __init__(self, df, open_statuses, group_frame, calendar=None):
+        # busdaycalendar does not pickle, so keep what it is made of.
+        self.workdays = None if calendar is None else dict(weekmask=calendar.weekmask, holidays=calendar.holidays)
+        codes, self.groups = group_codes(group_frame)
+        created, has_created = self._day_numbers(df, "Date Created")
+        closed, has_closed = self._day_numbers(df, "Date Closed")
+        due, has_due = self._day_numbers(df, "Due Date")
+        is_open = df["Status"].isin(open_statuses).to_numpy()
+
+        start = np.where(has_created, created, 0)
+        end = np.maximum(np.where(has_closed, closed, np.where(is_open, self.NEVER, start)), start)
+        due_start = np.where(has_due, np.maximum(due, start), self.NEVER)
+        aged = np.where(has_created, created, self.NEVER)
+        aged_end = np.maximum(np.minimum(end, np.where(has_due, due, self.NEVER)), aged)
+        reported = pd.to_numeric(df["Days Open"], errors="coerce").to_numpy(dtype=float)
+        self._rows = dict(start=start, end=end, due_start=due_start, aged=aged, has_created=has_created,
+                          reported=reported)
+
+        base = codes.astype(np.int64) * self.SPAN
+        self._keys = {name: np.sort(base + values) for name, values in dict(
+            start=start, end=end, due_start=due_start, due_end=np.maximum(end, due_start),
+            aged=aged, aged_end=aged_end).items()}
+        self._group_base = np.arange(len(self.groups), dtype=np.int64) * self.SPAN
+        self._group_offset = np.searchsorted(self._keys["start"], self._group_base)
+        order = np.argsort(base + aged_end, kind="stable")
+        self._window_aged = aged[order]
+
+    @classmethod
+    def _day_numbers(cls, df, col):
+        if col not in df.columns:
+            return np.zeros(len(df), dtype=np.int64), np.zeros(len(df), dtype=bool)
+        days = df[col].to_numpy().astype("datetime64[D]")
+        known = ~np.isnat(days)
+        return np.where(known, days.astype(np.int64) + cls.ORIGIN, 0), known
+
+    def _day(self, date):
+        return int(np.datetime64(date, "D").astype(np.int64)) + self.ORIGIN
+
+    def _cutoff(self, as_of, threshold):
+        # Latest Date Created that is more than `threshold` days old at `as_of`.
+        if self.workdays is None:
+            return self._day(as_of) - threshold - 1
+        return self._day(np.busday_offset(np.datetime64(as_of, "D"), -(threshold + 1),
+                                          roll="forward", **self.workdays))
+
+    def _at_most(self, name, day, codes):
+        return np.searchsorted(self._keys[name], self._group_base[codes] + day, side="right") - self._group_offset[codes]
+
+    def select(self, **filters):
+        return select_groups(self.groups, **filters)
+
+    def counts(self, as_of, threshold, selection):
+        """(open, closed, overdue) at the end of day `as_of` over the selected groups."""
+        codes = np.flatnonzero(selection)
+        day = self._day(as_of)
+        existing = self._at_most("start", day, codes).sum()
+        open_now = existing - self._at_most("end", day, codes).sum()
+        return int(open_now), int(existing - open_now), self.overdue(as_of, [threshold], selection)[0]
+
+    def overdue(self, as_of, thresholds, selection):
+        codes = np.flatnonzero(selection)
+        day = self._day(as_of)
+        past_due = (self._at_most("due_start", day, codes) - self._at_most("due_end", day, codes)).sum()
+        result = []
+        for threshold in thresholds:
+            cutoff = self._cutoff(as_of, threshold)
+            aged = (self._at_most("aged", cutoff, codes) - self._at_most("aged_end", cutoff, codes)).sum()
+            lo = self._group_offset[codes] + self._at_most("aged_end", cutoff, codes)
+            hi = self._group_offset[codes] + self._at_most("aged_end", day, codes)
+            leaving = sum(int(np.count_nonzero(self._window_aged[a:b] <= cutoff)) for a, b in zip(lo, hi))
+            result.append(int(past_due + aged - leaving))
+        return result
+
+    def exists_at(self, as_of):
+        return self._rows["start"] <= self._day(as_of)
+
+    def rows_at(self, as_of, threshold, rows):
+        """
+        (is_overdue, days_open) at `as_of` for the row positions `rows`. Days
+        Open keeps the export's own value where Date Created is missing.
+        """
+        r = {name: values[rows] for name, values in self._rows.items()}
+        day, cutoff = self._day(as_of), self._cutoff(as_of, threshold)
+        is_open = (r["start"] <= day) & (r["end"] > day)
+        is_overdue = is_open & ((r["due_start"] <= day) | (r["aged"] <= cutoff))
+        first = (r["start"] - self.ORIGIN).astype("datetime64[D]")
+        last = (np.minimum(r["end"], day) - self.ORIGIN).astype("datetime64[D]")
+        if self.workdays is None:
+            days_open = (last - first).astype(float)
+        else:
+            days_open = np.busday_count(first, last, **self.workdays).astype(float)
+        days_open = np.where(r["has_created"], days_open, r["reported"])
+        return is_overdue, days_open
+
+    def open_at(self, as_of, rows):
+        day = self._day(as_of)
+        return (self._rows["start"][rows] <= day) & (self._rows["end"][rows] > day)
+
+    def overdue_for_rows(self, as_of, thresholds, rows):
+        """Overdue count per threshold over row positions, for filters the groups can't express."""
+        r, day = self._rows, self._day(as_of)
+        is_open = (r["start"][rows] <= day) & (r["end"][rows] > day)
+        past_due = is_open & (r["due_start"][rows] <= day)
+        aged = np.sort(r["aged"][rows][is_open & ~past_due])
+        return [int(past_due.sum() + np.searchsorted(aged, self._cutoff(as_of, t), side="right")) for t in thresholds]
+
+
+# ============================================================
+# FILTER INDEX — packed bitmasks per filter value
+# ============================================================
+FILTER_COLUMNS = ["Contractor", "Discipline", "Status", "Ball in Court", "Spec Section",
+                  "CSI Division", "Priority", "Reviewer"]
+DATE_FILTER_COLUMNS = ["Date Created", "Due Date"]
+
+
+def csi_division(spec):
+    """'03 30 00 - Cast-in-Place Concrete' → '03'; mapped once per distinct spec section."""
+    return spec.map(lambda s: m.group(1) if isinstance(s, str) and (m := re.match(r"\s*(\d{2})", s)) else None)
+
+
+class FilterIndex:
+    """
+    One packed bitmask (np.packbits) per distinct value of each filter column,
+    and a sorted copy of each date column, built once per dataset. A selection
+    ORs the masks of the chosen values within a column, turns each date range
+    into a slice of the sorted dates (two binary searches), and ANDs it all;
+    the result is an array of row positions. Missing values match nothing.
+    """
+
+    def __init__(self, df, columns=FILTER_COLUMNS, date_columns=DATE_FILTER_COLUMNS):
+        self.n = len(df)
+        self.masks = {}
+        self.dates = {}
+        if "Spec Section" in df.columns:
+            df = df.assign(**{"CSI Division": csi_division(df["Spec Section"])})
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.masks[col] = {value: self._pack(order[bounds[k]:bounds[k + 1]])
+                               for k, value in enumerate(uniques)}
+        for col in date_columns:
+            if col in df.columns and pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+                days = df[col].to_numpy().astype("datetime64[D]")
+                order = np.argsort(days, kind="stable")  # NaT sorts last
+                self.dates[col] = (days[order], order)
+
+    def _pack(self, positions):
+        bits = np.zeros(self.n, dtype=bool)
+        bits[positions] = True
+        return np.packbits(bits)
+
+    def values(self, col):
+        return [v for v in self.masks.get(col, {}) if v != ""]
+
+    def rows(self, base=None, ranges=None, **selections):
+        """
+        Row positions in `base` (a boolean row mask, or all rows) matching every
+        selection and every inclusive (start, end) date range.
+        """
+        masks = [] if base is None else [np.packbits(base)]
+        for col, selected in selections.items():
+            if col not in self.masks:
+                continue
+            mask = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            for value in selected:
+                if value in self.masks[col]:
+                    mask |= self.masks[col][value]
+            masks.append(mask)
+        for col, (start, end) in (ranges or {}).items():
+            if col not in self.dates:
+                continue
+            days, order = self.dates[col]
+            lo = np.searchsorted(days, np.datetime64(start, "D"), side="left")
+            hi = np.searchsorted(days, np.datetime64(end, "D"), side="right")
+            masks.append(self._pack(order[lo:hi]))
+        if not masks:
+            return np.arange(self.n)
+        return np.flatnonzero(np.unpackbits(np.bitwise_and.reduce(masks), count=self.n))
+
+
+# ============================================================
+# FULL-TEXT SEARCH — inverted index over Title / Subject
+# ============================================================
+SEARCH_COLUMNS = {"submittal": "Title", "rfi": "Subject"}
+
+
+def search_terms(text):
+    """Same folding as person names: 'Fire-Stopping @ Level 2' → ['fire', 'stopping', 'level', '2']."""
+    return normalize_person_name(text).split()
+
+
+class SearchIndex:
+    """
+    Inverted index from word to the distinct titles containing it, built once
+    per dataset. Titles repeat heavily, so each distinct text is tokenized once
+    and rows keep only their text code. The vocabulary is sorted, so a prefix
+    is a slice of it (two binary searches). Every query word must match; the
+    result is a boolean row mask that ANDs into the filter bitmasks.
+    """
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.codes = codes.astype(np.int32)  # -1 (missing) indexes the trailing False below
+        self.n_texts = len(uniques)
+        words, texts = [], []
+        for k, text in enumerate(uniques):
+            terms = set(search_terms(text))
+            words.extend(terms)
+            texts.extend([k] * len(terms))
+        self.vocab, word_ids = np.unique(np.array(words, dtype=str), return_inverse=True)
+        order = np.argsort(word_ids, kind="stable")
+        self.postings = np.asarray(texts, dtype=np.int32)[order]
+        self.bounds = np.searchsorted(word_ids[order], np.arange(len(self.vocab) + 1))
+
+    def texts(self, term, prefix=False):
+        lo = np.searchsorted(self.vocab, term, side="left")
+        hi = np.searchsorted(self.vocab, term + "\U0010ffff", side="left") if prefix else \
+            lo + int(lo < len(self.vocab) and self.vocab[lo] == term)
+        return self.postings[self.bounds[lo]:self.bounds[hi]]
+
+    def mask(self, query, prefix=False):
+        """Rows whose text contains every word of `query` (or starts one, with prefix); None for an empty query."""
+        terms = search_terms(query)
+        if not terms:
+            return None
+        hit = np.zeros(self.n_texts + 1, dtype=bool)
+        matched = self.texts(terms[0], prefix)
+        for term in terms[1:]:
+            matched = np.intersect1d(matched, self.texts(term, prefix), assume_unique=False)
+        hit[matched] = True
+        return hit[self.codes]
+
+
+# ============================================================
+# CHART CUBE — counts and Days Open sums per dimension cell
+# ============================================================
+CUBE_DIMENSIONS = ["Contractor", "Status", "Ball in Court", "Discipline", "Priority", "Cost Impact"]
+# Cubes with more cells than this share of the rows save nothing over grouping
+# the rows themselves, so cube_stage skips them and every view is built from rows.
+CUBE_MAX_CELL_SHARE = 0.5
+WEEK = np.timedelta64(7, "D")
+
+
+def week_starts(dates):
+    """Monday of each date's ISO week (NaT stays NaT); 1970-01-01 was a Thursday."""
+    days = np.asarray(dates).astype("datetime64[D]")
+    return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+
+
+def whole_weeks(start, end):
+    """(first, last) Monday of the ISO weeks lying wholly inside [start, end]."""
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    first, last = week_starts(start), week_starts(end)
+    if first < start:
+        first += WEEK
+    if last + np.timedelta64(6, "D") > end:
+        last -= WEEK
+    return first, last
+
+
+class ChartCube:
+    """
+    Item count, Days Open sum and number of known Days Open per cell of
+    contractor × status × ball in court × discipline × priority × cost impact
+    × week created. Built once per dataset. Filter selections pick cells by
+    value and a Created between range the weeks it wholly covers; only the
+    items in its partial end weeks are aggregated from rows. Every chart is
+    then a small groupby over the selected cells. Search, the as-of date, due
+    dates and the spec / CSI / reviewer filters aren't cube dimensions, so those
+    views are a cube built from the filtered rows.
+    """
+
+    def __init__(self, cells, keep=None):
+        self.cells = cells
+        self.keep = np.ones(len(cells), dtype=bool) if keep is None else keep
+
+    @classmethod
+    def from_rows(cls, df, dimensions=CUBE_DIMENSIONS, aggregate=True):
+        """Cells of `df`; with `aggregate` off every row is its own cell, for data too fine-grained to pay off."""
+        dims = [c for c in dimensions if c in df.columns]
+        if "Date Created" in df.columns and pd.api.types.is_datetime64_any_dtype(df["Date Created"].dtype):
+            week = week_starts(df["Date Created"]).astype("datetime64[ns]")
+        else:
+            week = np.full(len(df), np.datetime64("NaT"), dtype="datetime64[ns]")
+        days = pd.to_numeric(df["Days Open"], errors="coerce").to_numpy(dtype=float)
+        frame = df[dims].assign(**{"Created Week": week, "Days Open": np.nan_to_num(days),
+                                   "Days Known": ~np.isnan(days)})
+        if not aggregate:
+            return cls(frame.assign(Count=1).reset_index(drop=True))
+        cells = frame.groupby(dims + ["Created Week"], observed=True, dropna=False, sort=False).agg(
+            Count=("Days Known", "size"), **{"Days Open": ("Days Open", "sum"), "Days Known": ("Days Known", "sum")})
+        return cls(cells.reset_index())
+
+    def slice(self, created=None, **selections):
+        """
+        Cells matching every selection (missing values match nothing) whose
+        week lies wholly inside the inclusive `created` (start, end) range.
+        """
+        keep = self.keep.copy()
+        for col, selected in selections.items():
+            if col not in self.cells.columns:
+                continue
+            values = self.cells[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):  # one lookup per category, then per code
+                hit = np.append(values.cat.categories.isin(selected), False)
+                keep &= hit[values.cat.codes.to_numpy()]
+            else:
+                keep &= values.isin(selected).to_numpy()
+        if created is not None:
+            first, last = whole_weeks(*created)
+            weeks = self.cells["Created Week"].to_numpy().astype("datetime64[D]")
+            keep &= (weeks >= first) & (weeks <= last)
+        return ChartCube(self.cells, keep)
+
+    def view(self, rows, created=None, **selections):
+        """
+        The cube restricted to `rows`, the frame the same filters already
+        produced: whole weeks come from the cells, and the rows created in the
+        range's partial first or last week are aggregated and added.
+        """
+        view = self.slice(created, **selections)
+        if created is None:
+            return view
+        first, last = whole_weeks(*created)
+        weeks = week_starts(rows["Date Created"])
+        partial = (weeks < first) | (weeks > last)
+        if not partial.any():
+            return view
+        edges = ChartCube.from_rows(rows[partial])
+        return ChartCube(pd.concat([view.cells[view.keep], edges.cells], ignore_index=True))
+
+    def _selected(self, by, measures):
+        by = [by] if isinstance(by, str) else by
+        cells = self.cells[by + measures] if self.keep.all() else self.cells.loc[self.keep, by + measures]
+        return cells.groupby(by, observed=True)
+
+    def counts(self, by):
+        """Item count per value of `by` (a column or list), largest first for a single column."""
+        counts = self._selected(by, ["Count"])["Count"].sum().loc[lambda c: c > 0]
+        return counts.sort_values(ascending=False, kind="stable").reset_index() if isinstance(by, str) \
+            else counts.reset_index()
+
+    def mean_days(self, by):
+        sums = self._selected(by, ["Days Open", "Days Known"]).sum()
+        return (sums["Days Open"] / sums["Days Known"].where(sums["Days Known"] > 0)).dropna().reset_index(name="Avg Days")
+
+
+# ============================================================
+# STAGED PIPELINE — parse → normalize (+ search index) → companies → classify
+#                  → day counts → overdue (+ chart cube) → as-of → filter index
+# ============================================================
+# Each stage is memoized on its real inputs only: the dataset key (content hash
+# of the parsed upload), the item type and the report date, plus the resolution
+# key (employee directory version, fuzzy flag) for the stages that see companies
+# and the day basis plus calendar key (holiday calendar version, on the
+# working-day basis only) for the day counts and everything built on them.
+# Classification is keyed by the status rules version instead, and the as-of
+# and overdue stages by the open statuses it returns.
+# Slider, as-of date and filter changes miss none of them. The narrowed-selection
+# tallies are also keyed by the selection and as-of date, so slider moves reuse
+# them as well.
+@st.cache_data(show_spinner=False, max_entries=16)
+def normalize_stage(dataset_key, item_type, report_date, _raw_df):
+    return normalize_columns(_raw_df, item_type)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def search_stage(dataset_key, item_type, report_date, _df):
+    return SearchIndex(_df[SEARCH_COLUMNS[item_type]])
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def company_stage(dataset_key, item_type, report_date, resolution_key, _df, _directory):
+    _, fuzzy = resolution_key
+    return resolve_company_columns(_df, _directory, fuzzy)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def classify_stage(dataset_key, item_type, report_date, rules_version, _df, _rules):
+    return classify_statuses(_df, _rules)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def days_stage(dataset_key, item_type, report_date, resolution_key, day_basis, calendar_key, _df, _calendar):
+    return apply_day_basis(_df, _calendar if day_basis == "Working days" else None)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def as_of_stage(dataset_key, item_type, report_date, resolution_key, day_basis, calendar_key, open_statuses,
+                _df, _calendar):
+    group_cols = ["Contractor", "Discipline"] if item_type == "rfi" and "Discipline" in _df.columns else ["Contractor"]
+    return AsOfIndex(_df, open_statuses, _df[group_cols], _calendar if day_basis == "Working days" else None)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def filter_stage(dataset_key, item_type, report_date, resolution_key, _df):
+    return FilterIndex(_df)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cube_stage(dataset_key, item_type, report_date, resolution_key, day_basis, calendar_key, _df):
+    cube = ChartCube.from_rows(_df)
+    return None if len(cube.cells) > CUBE_MAX_CELL_SHARE * len(_df) else cube
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def overdue_stage(dataset_key, item_type, report_date, resolution_key, day_basis, calendar_key, open_statuses,
+                  closed_statuses, _df):
+    group_cols = ["Contractor", "Discipline"] if item_type == "rfi" and "Discipline" in _df.columns else ["Contractor"]
+    df = add_overdue_horizon(_df, open_statuses)
+    return df, OverdueCurve(df["Overdue Above"].to_numpy(), df[group_cols],
+                            df["Status"].isin(open_statuses).to_numpy(), df["Status"].isin(closed_statuses).to_numpy())
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def selection_stage(dataset_key, item_type, report_date, resolution_key, day_basis, calendar_key, open_statuses,
+                    closed_statuses, as_of, selection, _view, _rows, _curve, _index):
+    """
+    Open, closed and overdue-per-threshold over a narrowed selection (search,
+    status / spec / date filters), keyed by the selection itself: a slider move
+    reads another point off the cached curve instead of re-sorting the rows.
+    """
+    if _index is None:
+        open_count, closed_count = status_counts(_view, open_statuses, closed_statuses)
+        return open_count, closed_count, _curve.counts_for_rows(_view["Overdue Above"].to_numpy())
+    open_count = int(_index.open_at(as_of, _rows).sum())
+    return open_count, len(_rows) - open_count, np.array(_index.overdue_for_rows(as_of, _curve.thresholds, _rows))
+
+
 # ============================================================
 # SAMPLE DATA GENERATORS
 # ============================================================
@@ -520,7 +2041,7 @@ with st.sidebar:
 
     if data_source == "📤 Upload File":
         st.markdown("---")
-        st.caption("Supported: CSV, Excel (.xlsx/.xls), PDF")
+        st.caption("Supported: CSV, Excel (.xlsx/.xls), PDF, Parquet/Feather/Arrow")
         st.markdown("**Upload Submittals**")
         sub_file = st.file_uploader("Submittals", type=SUPPORTED_TYPES, key="sub", label_visibility="collapsed")
         st.markdown("**Upload RFIs**")
@@ -533,35 +2054,79 @@ with st.sidebar:
     st.markdown("### ⚙️ Settings")
     submittal_threshold = st.slider("Submittal overdue threshold (days)", 5, 30, 14)
     rfi_threshold = st.slider("RFI overdue threshold (days)", 3, 21, 10)
+    fuzzy_matching = st.checkbox("Fuzzy name matching", value=False,
+                                 help="Match misspelled or differently accented employee names to the directory")
+    day_basis = st.radio("Count Days Open in", DAY_BASES, horizontal=True,
+                         help="Working days skip weekends and the holidays listed in holidays.csv")
     today = datetime.now()
-    st.markdown(f"<p style='color:{COLORS['muted']}; font-size: 0.8rem;'>Report Date: {today.strftime('%B %d, %Y')}</p>", unsafe_allow_html=True)
+    as_of = st.date_input("As of", value=today.date(), max_value=today.date(),
+                          help="Re-evaluate open / overdue items and Days Open at a past date, "
+                               "from Date Created, Date Closed and Due Date")
+    st.markdown(f"<p style='color:{COLORS['muted']}; font-size: 0.8rem;'>Report Date: {as_of.strftime('%B %d, %Y')}</p>", unsafe_allow_html=True)
 
 # Load data
+report_date = today.date()
+df_sub, sub_key = None, None
 if data_source == "📤 Upload File" and sub_file is not None:
-    df_sub = parse_uploaded_file(sub_file)
-    if df_sub is None:
-        df_sub = generate_sample_submittals()
-else:
-    df_sub = generate_sample_submittals()
+    df_sub, sub_key = parse_uploaded_file(sub_file, "submittal")
+if df_sub is None:
+    df_sub, sub_key = generate_sample_submittals(), "sample-submittals"
 
+df_rfi, rfi_key = None, None
 if data_source == "📤 Upload File" and rfi_file is not None:
-    df_rfi = parse_uploaded_file(rfi_file)
-    if df_rfi is None:
-        df_rfi = generate_sample_rfis()
-else:
-    df_rfi = generate_sample_rfis()
+    df_rfi, rfi_key = parse_uploaded_file(rfi_file, "rfi")
+if df_rfi is None:
+    df_rfi, rfi_key = generate_sample_rfis(), "sample-rfis"
 
 # Normalize
-df_sub = normalize_columns(df_sub, "submittal")
-df_rfi = normalize_columns(df_rfi, "rfi")
+df_sub, sub_slow_dates = normalize_stage(sub_key, "submittal", report_date, df_sub)
+df_rfi, rfi_slow_dates = normalize_stage(rfi_key, "rfi", report_date, df_rfi)
+sub_search = search_stage(sub_key, "submittal", report_date, df_sub)
+rfi_search = search_stage(rfi_key, "rfi", report_date, df_rfi)
+
+# Resolve companies against the (hot-reloaded) employee directory
+directory = load_employee_directory()
+resolution_key = (directory.version, fuzzy_matching)
+df_sub, sub_fuzzy_hits = company_stage(sub_key, "submittal", report_date, resolution_key, df_sub, directory)
+df_rfi, rfi_fuzzy_hits = company_stage(rfi_key, "rfi", report_date, resolution_key, df_rfi, directory)
 
 # Auto-detect open/closed statuses
-sub_open_statuses, sub_closed_statuses = classify_statuses(df_sub)
-rfi_open_statuses, rfi_closed_statuses = classify_statuses(df_rfi)
+status_rules = load_status_rules()
+sub_open_statuses, sub_closed_statuses = classify_stage(sub_key, "submittal", report_date, status_rules.version,
+                                                        df_sub, status_rules)
+rfi_open_statuses, rfi_closed_statuses = classify_stage(rfi_key, "rfi", report_date, status_rules.version,
+                                                        df_rfi, status_rules)
+
+# Count Days Open / Days Past Due on the selected basis
+# The holiday calendar only matters on the working-day basis, so only then is its
+# version part of the key; editing holidays.csv leaves calendar-day results cached.
+calendar, calendar_version = load_business_calendar()
+calendar_key = calendar_version if day_basis == "Working days" else None
+df_sub = days_stage(sub_key, "submittal", report_date, resolution_key, day_basis, calendar_key, df_sub, calendar)
+df_rfi = days_stage(rfi_key, "rfi", report_date, resolution_key, day_basis, calendar_key, df_rfi, calendar)
+
+# Calculate overdue — the thresholds only pick a point on the precomputed curves
+df_sub, sub_curve = overdue_stage(sub_key, "submittal", report_date, resolution_key, day_basis, calendar_key,
+                                  sub_open_statuses, sub_closed_statuses, df_sub)
+df_rfi, rfi_curve = overdue_stage(rfi_key, "rfi", report_date, resolution_key, day_basis, calendar_key,
+                                  rfi_open_statuses, rfi_closed_statuses, df_rfi)
+sub_cube = cube_stage(sub_key, "submittal", report_date, resolution_key, day_basis, calendar_key, df_sub)
+rfi_cube = cube_stage(rfi_key, "rfi", report_date, resolution_key, day_basis, calendar_key, df_rfi)
+
+# Time travel — open / overdue and Days Open re-evaluated at the as-of date
+time_travel = as_of < report_date
+if time_travel:
+    sub_index = as_of_stage(sub_key, "submittal", report_date, resolution_key, day_basis, calendar_key,
+                            sub_open_statuses, df_sub, calendar)
+    rfi_index = as_of_stage(rfi_key, "rfi", report_date, resolution_key, day_basis, calendar_key,
+                            rfi_open_statuses, df_rfi, calendar)
+    sub_exists, rfi_exists = sub_index.exists_at(as_of), rfi_index.exists_at(as_of)
+else:
+    sub_index = rfi_index = sub_exists = rfi_exists = None
 
-# Calculate overdue
-df_sub = calculate_overdue(df_sub, submittal_threshold, sub_open_statuses)
-df_rfi = calculate_overdue(df_rfi, rfi_threshold, rfi_open_statuses)
+# Filter indexes — sidebar selections become bitmask ORs / ANDs
+sub_filter_index = filter_stage(sub_key, "submittal", report_date, resolution_key, df_sub)
+rfi_filter_index = filter_stage(rfi_key, "rfi", report_date, resolution_key, df_rfi)
 
 # Sidebar debug info
 with st.sidebar:
@@ -571,10 +2136,18 @@ with st.sidebar:
         st.caption(", ".join(df_sub.columns.tolist()))
         st.caption(f"**Open statuses:** {sub_open_statuses}")
         st.caption(f"**Closed statuses:** {sub_closed_statuses}")
+        if sub_slow_dates:
+            st.caption(f"**Dates parsed per value:** {sub_slow_dates:,} cells")
+        if sub_fuzzy_hits:
+            st.caption("**Fuzzy matches:** " + "; ".join(f"{k} → {v}" for k, v in sub_fuzzy_hits.items()))
     with st.expander("RFI columns"):
         st.caption(", ".join(df_rfi.columns.tolist()))
         st.caption(f"**Open statuses:** {rfi_open_statuses}")
         st.caption(f"**Closed statuses:** {rfi_closed_statuses}")
+        if rfi_slow_dates:
+            st.caption(f"**Dates parsed per value:** {rfi_slow_dates:,} cells")
+        if rfi_fuzzy_hits:
+            st.caption("**Fuzzy matches:** " + "; ".join(f"{k} → {v}" for k, v in rfi_fuzzy_hits.items()))
 
 
 # ============================================================
@@ -582,19 +2155,85 @@ with st.sidebar:
 # ============================================================
 with st.sidebar:
     st.markdown("### 🔍 Filters")
-    contractors_all = sorted(set(df_sub["Contractor"].unique()) | set(df_rfi["Contractor"].unique()))
+    search_query = st.text_input("Search titles / subjects", placeholder="e.g. firestop level 2")
+    search_prefix = st.checkbox("Match word beginnings", value=True,
+                                help="'fire' also finds 'firestop' and 'fireproofing'")
+    contractors_all = sorted(set(sub_filter_index.values("Contractor")) | set(rfi_filter_index.values("Contractor")))
     sel_contractors = st.multiselect("Contractor", contractors_all, default=contractors_all)
 
     if "Discipline" in df_rfi.columns:
-        disciplines_all = sorted(df_rfi["Discipline"].dropna().unique())
+        disciplines_all = sorted(rfi_filter_index.values("Discipline"))
         sel_disciplines = st.multiselect("RFI Discipline", disciplines_all, default=disciplines_all)
     else:
         sel_disciplines = []
 
-df_sub_f = df_sub[df_sub["Contractor"].isin(sel_contractors)]
-df_rfi_f = df_rfi[df_rfi["Contractor"].isin(sel_contractors)]
-if sel_disciplines:
-    df_rfi_f = df_rfi_f[df_rfi_f["Discipline"].isin(sel_disciplines)]
+    # Narrowing filters: an empty selection means "no filter"
+    sub_extra, rfi_extra, date_ranges = {}, {}, {}
+    with st.expander("More filters"):
+        for label, col, index, extra in [
+            ("Submittal Status", "Status", sub_filter_index, sub_extra),
+            ("RFI Status", "Status", rfi_filter_index, rfi_extra),
+            ("CSI Division", "CSI Division", sub_filter_index, sub_extra),
+            ("Spec Section", "Spec Section", sub_filter_index, sub_extra),
+            ("Reviewer", "Reviewer", sub_filter_index, sub_extra),
+            ("RFI Priority", "Priority", rfi_filter_index, rfi_extra),
+        ]:
+            options = sorted(index.values(col), key=str)
+            if options:
+                selected = st.multiselect(label, options, key=f"filter_{label}")
+                if selected:
+                    extra[col] = selected
+        bic_all = sorted(set(sub_filter_index.values("Ball in Court")) | set(rfi_filter_index.values("Ball in Court")), key=str)
+        sel_bic = st.multiselect("Ball in Court", bic_all)
+        if sel_bic:
+            sub_extra["Ball in Court"] = rfi_extra["Ball in Court"] = sel_bic
+        for label, col in [("Created between", "Date Created"), ("Due between", "Due Date")]:
+            picked = st.date_input(label, value=(), key=f"filter_{col}")
+            if len(picked) == 2:
+                date_ranges[col] = picked
+
+sub_filters = {"Contractor": sel_contractors}
+rfi_filters = {"Contractor": sel_contractors, **({"Discipline": sel_disciplines} if sel_disciplines else {})}
+# Contractor / Discipline alone are answered by the overdue curve and as-of index;
+# narrowing filters fall back to counting the selected rows.
+sub_found = sub_search.mask(search_query, search_prefix)
+rfi_found = rfi_search.mask(search_query, search_prefix)
+sub_narrowed = bool(sub_extra or date_ranges) or sub_found is not None
+rfi_narrowed = bool(rfi_extra or date_ranges) or rfi_found is not None
+search_key = (search_query, search_prefix)
+sub_selection = (sub_filters, sub_extra, date_ranges, search_key if sub_found is not None else None)
+rfi_selection = (rfi_filters, rfi_extra, date_ranges, search_key if rfi_found is not None else None)
+if sub_found is not None and sub_exists is not None:
+    sub_found &= sub_exists
+if rfi_found is not None and rfi_exists is not None:
+    rfi_found &= rfi_exists
+
+# Filtered views are row positions; the frames are only sliced when rows drop out.
+sub_rows = sub_filter_index.rows(sub_exists if sub_found is None else sub_found, date_ranges, **sub_filters, **sub_extra)
+rfi_rows = rfi_filter_index.rows(rfi_exists if rfi_found is None else rfi_found, date_ranges, **rfi_filters, **rfi_extra)
+df_sub_f = df_sub if len(sub_rows) == len(df_sub) else df_sub.iloc[sub_rows]
+df_rfi_f = df_rfi if len(rfi_rows) == len(df_rfi) else df_rfi.iloc[rfi_rows]
+
+# Overdue flags exist only for the filtered rows the alerts and export list.
+if time_travel:
+    sub_is_overdue, sub_days_open = sub_index.rows_at(as_of, submittal_threshold, sub_rows)
+    rfi_is_overdue, rfi_days_open = rfi_index.rows_at(as_of, rfi_threshold, rfi_rows)
+    df_sub_f, df_rfi_f = df_sub_f.assign(**{"Days Open": sub_days_open}), df_rfi_f.assign(**{"Days Open": rfi_days_open})
+else:
+    sub_is_overdue = df_sub_f["Overdue Above"].to_numpy() > submittal_threshold
+    rfi_is_overdue = df_rfi_f["Overdue Above"].to_numpy() > rfi_threshold
+
+# Charts read cube cells: selections on cube dimensions and the whole weeks of a
+# Created between range slice the cube, while time travel, search, due dates and
+# the spec / CSI / reviewer filters re-aggregate the filtered rows. Datasets too
+# fine-grained for a cube to pay off have none, and group the filtered rows as is.
+sub_selected, rfi_selected = {**sub_filters, **sub_extra}, {**rfi_filters, **rfi_extra}
+sub_cube_f = ChartCube.from_rows(df_sub_f, aggregate=sub_cube is not None) if sub_cube is None or time_travel or sub_found is not None or \
+    "Due Date" in date_ranges or set(sub_selected) - set(CUBE_DIMENSIONS) else \
+    sub_cube.view(df_sub_f, date_ranges.get("Date Created"), **sub_selected)
+rfi_cube_f = ChartCube.from_rows(df_rfi_f, aggregate=rfi_cube is not None) if rfi_cube is None or time_travel or rfi_found is not None or \
+    "Due Date" in date_ranges or set(rfi_selected) - set(CUBE_DIMENSIONS) else \
+    rfi_cube.view(df_rfi_f, date_ranges.get("Date Created"), **rfi_selected)
 
 
 # ============================================================
@@ -611,12 +2250,27 @@ def metric_card(label, value, color):
 st.markdown("<div class='section-header'>📊 Overview</div>", unsafe_allow_html=True)
 
 col1, col2, col3, col4, col5, col6 = st.columns(6)
-sub_open = df_sub_f[df_sub_f["Status"].isin(sub_open_statuses)].shape[0]
-sub_closed = df_sub_f[df_sub_f["Status"].isin(sub_closed_statuses)].shape[0]
-sub_overdue = df_sub_f["Is Overdue"].sum()
-rfi_open = df_rfi_f[df_rfi_f["Status"].isin(rfi_open_statuses)].shape[0]
-rfi_closed = df_rfi_f[df_rfi_f["Status"].isin(rfi_closed_statuses)].shape[0]
-rfi_overdue = df_rfi_f["Is Overdue"].sum()
+# Contractor / Discipline alone: the cached per-dataset tallies (curve or as-of
+# index). Narrowing filters are tallied once per selection, curve included.
+sub_curve_f = rfi_curve_f = None
+if sub_narrowed:
+    sub_open, sub_closed, sub_curve_f = selection_stage(
+        sub_key, "submittal", report_date, resolution_key, day_basis, calendar_key, sub_open_statuses,
+        sub_closed_statuses, as_of if time_travel else None, sub_selection, df_sub_f, sub_rows, sub_curve, sub_index)
+    sub_overdue = sub_curve_f[min(submittal_threshold, len(sub_curve_f) - 1)]
+elif time_travel:
+    sub_open, sub_closed, sub_overdue = sub_index.counts(as_of, submittal_threshold, sub_index.select(**sub_filters))
+else:
+    sub_open, sub_closed, sub_overdue = sub_curve.tally(submittal_threshold, sub_curve.select(**sub_filters))
+if rfi_narrowed:
+    rfi_open, rfi_closed, rfi_curve_f = selection_stage(
+        rfi_key, "rfi", report_date, resolution_key, day_basis, calendar_key, rfi_open_statuses,
+        rfi_closed_statuses, as_of if time_travel else None, rfi_selection, df_rfi_f, rfi_rows, rfi_curve, rfi_index)
+    rfi_overdue = rfi_curve_f[min(rfi_threshold, len(rfi_curve_f) - 1)]
+elif time_travel:
+    rfi_open, rfi_closed, rfi_overdue = rfi_index.counts(as_of, rfi_threshold, rfi_index.select(**rfi_filters))
+else:
+    rfi_open, rfi_closed, rfi_overdue = rfi_curve.tally(rfi_threshold, rfi_curve.select(**rfi_filters))
 
 with col1:
     st.markdown(metric_card("Submittals Open", sub_open, COLORS["warning"]), unsafe_allow_html=True)
@@ -635,8 +2289,13 @@ with col6:
 # ============================================================
 # OVERDUE ALERTS
 # ============================================================
-overdue_subs = df_sub_f[df_sub_f["Is Overdue"]].sort_values("Days Open", ascending=False)
-overdue_rfis = df_rfi_f[df_rfi_f["Is Overdue"]].sort_values("Days Open", ascending=False)
+overdue_subs = df_sub_f[sub_is_overdue].sort_values("Days Open", ascending=False)
+overdue_rfis = df_rfi_f[rfi_is_overdue].sort_values("Days Open", ascending=False)
+
+
+def days_open_text(days):
+    return "days open unknown" if pd.isna(days) else f"{int(days)} days open"
+
 
 if len(overdue_subs) > 0 or len(overdue_rfis) > 0:
     st.markdown("<div class='section-header'>🚨 Overdue Alerts</div>", unsafe_allow_html=True)
@@ -649,7 +2308,7 @@ if len(overdue_subs) > 0 or len(overdue_rfis) > 0:
         st.markdown(
             f"<div class='alert-banner'>⚠️ <b>{row[id_col_sub]}</b> — {row[title_col_sub]} | "
             f"Contractor: {row['Contractor']} | Ball in Court: {row[bic_display_sub]} | "
-            f"<b>{int(row['Days Open'])} days open</b></div>",
+            f"<b>{days_open_text(row['Days Open'])}</b></div>",
             unsafe_allow_html=True
         )
 
@@ -661,7 +2320,7 @@ if len(overdue_subs) > 0 or len(overdue_rfis) > 0:
         st.markdown(
             f"<div class='alert-banner'>⚠️ <b>{row[id_col_rfi]}</b> — {row[title_col_rfi]} | "
             f"Contractor: {row['Contractor']} | Ball in Court: {row[bic_display_rfi]} | "
-            f"<b>{int(row['Days Open'])} days open</b></div>",
+            f"<b>{days_open_text(row['Days Open'])}</b></div>",
             unsafe_allow_html=True
         )
 
@@ -684,7 +2343,7 @@ with tab1:
 
     col_a, col_b = st.columns(2)
     with col_a:
-        fig = px.pie(df_sub_f, names="Status", hole=0.5,
+        fig = px.pie(sub_cube_f.counts("Status"), names="Status", values="Count", hole=0.5,
                      color_discrete_sequence=[COLORS["warning"], COLORS["blue"], COLORS["success"],
                                                COLORS["accent"], COLORS["danger"], COLORS["accent2"]],
                      title="Submittal Status Distribution")
@@ -694,10 +2353,8 @@ with tab1:
         st.plotly_chart(fig, use_container_width=True)
 
     with col_b:
-        bic = df_sub_f[df_sub_f["Status"].isin(sub_open_statuses)]
-        if not bic.empty:
-            bic_c = bic["Ball in Court"].value_counts().reset_index()
-            bic_c.columns = ["Ball in Court", "Count"]
+        bic_c = sub_cube_f.slice(Status=sub_open_statuses).counts("Ball in Court")
+        if not bic_c.empty:
             fig = px.bar(bic_c, x="Ball in Court", y="Count",
                          color="Count", color_continuous_scale=["#E2E8F0", COLORS["accent"]],
                          title="Open Submittals — Ball in Court (Company)")
@@ -705,7 +2362,7 @@ with tab1:
             st.plotly_chart(fig, use_container_width=True)
 
     st.markdown("**Submittals by Contractor**")
-    sub_contr = df_sub_f.groupby(["Contractor", "Status"]).size().reset_index(name="Count")
+    sub_contr = sub_cube_f.counts(["Contractor", "Status"])
     fig = px.bar(sub_contr, x="Contractor", y="Count", color="Status", barmode="stack",
                  color_discrete_sequence=[COLORS["warning"], COLORS["blue"], COLORS["success"],
                                            COLORS["accent"], COLORS["danger"], COLORS["accent2"]])
@@ -719,7 +2376,7 @@ with tab1:
         if dc in display_sub.columns and pd.api.types.is_datetime64_any_dtype(display_sub[dc]):
             display_sub[dc] = display_sub[dc].apply(lambda x: x.strftime("%Y-%m-%d") if pd.notna(x) else "")
     # Swap Ball in Court back to employee names for the table
-    hide_cols = [c for c in ["Is Overdue", "Procore Overdue", "Ball in Court"] if c in display_sub.columns]
+    hide_cols = [c for c in ["Overdue Above", "Procore Overdue", "Ball in Court"] if c in display_sub.columns]
     if "Ball in Court (Names)" in display_sub.columns:
         display_sub = display_sub.rename(columns={"Ball in Court (Names)": "Ball in Court"})
     else:
@@ -727,7 +2384,7 @@ with tab1:
     st.dataframe(
         display_sub.drop(columns=hide_cols, errors="ignore"), use_container_width=True, height=400,
         column_config={"Days Open": st.column_config.ProgressColumn(
-            "Days Open", min_value=0, max_value=max(int(df_sub_f["Days Open"].max()), 1), format="%d days"
+            "Days Open", min_value=0, max_value=max(int(np.nan_to_num(df_sub_f["Days Open"].max())), 1), format="%d days"
         )}
     )
 
@@ -737,7 +2394,7 @@ with tab2:
 
     col_c, col_d = st.columns(2)
     with col_c:
-        fig = px.pie(df_rfi_f, names="Status", hole=0.5,
+        fig = px.pie(rfi_cube_f.counts("Status"), names="Status", values="Count", hole=0.5,
                      color_discrete_sequence=[COLORS["warning"], COLORS["blue"], COLORS["success"], COLORS["danger"]],
                      title="RFI Status Distribution")
         fig.update_layout(paper_bgcolor=COLORS["bg"], plot_bgcolor=COLORS["bg"],
@@ -746,8 +2403,7 @@ with tab2:
 
     with col_d:
         if "Discipline" in df_rfi_f.columns:
-            dc = df_rfi_f["Discipline"].value_counts().reset_index()
-            dc.columns = ["Discipline", "Count"]
+            dc = rfi_cube_f.counts("Discipline")
             fig = px.bar(dc, x="Discipline", y="Count",
                          color="Count", color_continuous_scale=["#E2E8F0", COLORS["accent2"]],
                          title="RFIs by Discipline")
@@ -757,8 +2413,7 @@ with tab2:
     col_e, col_f = st.columns(2)
     with col_e:
         if "Priority" in df_rfi_f.columns:
-            pri = df_rfi_f["Priority"].value_counts().reset_index()
-            pri.columns = ["Priority", "Count"]
+            pri = rfi_cube_f.counts("Priority")
             fig = px.bar(pri, x="Priority", y="Count", color="Priority",
                          color_discrete_map={"Critical": COLORS["danger"], "High": COLORS["warning"],
                                               "Medium": COLORS["blue"], "Low": COLORS["muted"]},
@@ -768,8 +2423,7 @@ with tab2:
 
     with col_f:
         if "Cost Impact" in df_rfi_f.columns:
-            cost = df_rfi_f["Cost Impact"].value_counts().reset_index()
-            cost.columns = ["Cost Impact", "Count"]
+            cost = rfi_cube_f.counts("Cost Impact")
             fig = px.pie(cost, names="Cost Impact", values="Count", hole=0.5,
                          color_discrete_sequence=[COLORS["success"], COLORS["warning"], COLORS["danger"]],
                          title="RFI Cost Impact")
@@ -783,7 +2437,7 @@ with tab2:
     for dc in ["Date Created", "Due Date", "Date Closed"]:
         if dc in display_rfi.columns and pd.api.types.is_datetime64_any_dtype(display_rfi[dc]):
             display_rfi[dc] = display_rfi[dc].apply(lambda x: x.strftime("%Y-%m-%d") if pd.notna(x) else "")
-    hide_cols = [c for c in ["Is Overdue", "Procore Overdue", "Ball in Court"] if c in display_rfi.columns]
+    hide_cols = [c for c in ["Overdue Above", "Procore Overdue", "Ball in Court"] if c in display_rfi.columns]
     if "Ball in Court (Names)" in display_rfi.columns:
         display_rfi = display_rfi.rename(columns={"Ball in Court (Names)": "Ball in Court"})
     else:
@@ -791,7 +2445,7 @@ with tab2:
     st.dataframe(
         display_rfi.drop(columns=hide_cols, errors="ignore"), use_container_width=True, height=400,
         column_config={"Days Open": st.column_config.ProgressColumn(
-            "Days Open", min_value=0, max_value=max(int(df_rfi_f["Days Open"].max()), 1), format="%d days"
+            "Days Open", min_value=0, max_value=max(int(np.nan_to_num(df_rfi_f["Days Open"].max())), 1), format="%d days"
         )}
     )
 
@@ -801,9 +2455,7 @@ with tab3:
 
     col_g, col_h = st.columns(2)
     with col_g:
-        avg = df_sub_f.groupby("Contractor")["Days Open"].mean().reset_index()
-        avg.columns = ["Contractor", "Avg Days"]
-        avg = avg.sort_values("Avg Days", ascending=False)
+        avg = sub_cube_f.mean_days("Contractor").sort_values("Avg Days", ascending=False)
         fig = px.bar(avg, x="Contractor", y="Avg Days",
                      color="Avg Days", color_continuous_scale=["#059669", "#D97706", "#DC2626"],
                      title="Avg Submittal Turnaround by Contractor")
@@ -811,9 +2463,7 @@ with tab3:
         st.plotly_chart(fig, use_container_width=True)
 
     with col_h:
-        avg = df_rfi_f.groupby("Contractor")["Days Open"].mean().reset_index()
-        avg.columns = ["Contractor", "Avg Days"]
-        avg = avg.sort_values("Avg Days", ascending=False)
+        avg = rfi_cube_f.mean_days("Contractor").sort_values("Avg Days", ascending=False)
         fig = px.bar(avg, x="Contractor", y="Avg Days",
                      color="Avg Days", color_continuous_scale=["#059669", "#D97706", "#DC2626"],
                      title="Avg RFI Response Time by Contractor")
@@ -822,10 +2472,8 @@ with tab3:
 
     # Ball in Court treemap — uses company names
     st.markdown("**Ball in Court — Who's Holding Open Items?**")
-    bic_sub = df_sub_f[~df_sub_f["Ball in Court"].isin(["Closed", ""])].groupby(
-        ["Contractor", "Ball in Court"]).size().reset_index(name="Count")
-    bic_rfi = df_rfi_f[~df_rfi_f["Ball in Court"].isin(["Closed", ""])].groupby(
-        ["Contractor", "Ball in Court"]).size().reset_index(name="Count")
+    bic_sub, bic_rfi = [cube.counts(["Contractor", "Ball in Court"]).loc[lambda c: ~c["Ball in Court"].isin(["Closed", ""])]
+                        for cube in (sub_cube_f, rfi_cube_f)]
     bic_all = pd.concat([bic_sub.assign(Type="Submittal"), bic_rfi.assign(Type="RFI")])
 
     if not bic_all.empty:
@@ -835,26 +2483,40 @@ with tab3:
         fig.update_layout(paper_bgcolor=COLORS["bg"], font=dict(color=COLORS["text"]), title_font_size=14)
         st.plotly_chart(fig, use_container_width=True)
 
+    # Threshold sensitivity — straight off the precomputed curves
+    st.markdown("**Overdue Items vs Threshold**")
+    fig_thr = go.Figure()
+    for label, curve, index, filters, narrowed_curve, threshold, color in [
+        ("Submittals", sub_curve, sub_index, sub_filters, sub_curve_f, submittal_threshold, COLORS["accent"]),
+        ("RFIs", rfi_curve, rfi_index, rfi_filters, rfi_curve_f, rfi_threshold, COLORS["accent2"]),
+    ]:
+        if narrowed_curve is not None:
+            counts = narrowed_curve
+        elif time_travel:
+            counts = np.array(index.overdue(as_of, curve.thresholds, index.select(**filters)))
+        else:
+            counts = curve.counts(curve.select(**filters))
+        fig_thr.add_trace(go.Scatter(x=curve.thresholds, y=counts, mode="lines", name=label,
+                                     line=dict(color=color, width=2, shape="hv")))
+        fig_thr.add_trace(go.Scatter(x=[threshold], y=[counts[min(threshold, len(counts) - 1)]], mode="markers",
+                                     name=f"{label} threshold", marker=dict(color=color, size=10), showlegend=False))
+    fig_thr.update_layout(
+        paper_bgcolor=COLORS["bg"], plot_bgcolor=COLORS["bg"], font=dict(color=COLORS["text"]),
+        xaxis=dict(gridcolor=COLORS["grid"], title="Overdue threshold (days)"),
+        yaxis=dict(gridcolor=COLORS["grid"], title="Overdue items"),
+        legend=dict(orientation="h", y=-0.15), height=350
+    )
+    st.plotly_chart(fig_thr, use_container_width=True)
+
     # Cumulative trend
     st.markdown("**Cumulative Open Items Over Time**")
     fig_trend = go.Figure()
-    if "Date Created" in df_sub_f.columns and df_sub_f["Date Created"].notna().any():
-        sc = df_sub_f.dropna(subset=["Date Created"]).groupby(
-            df_sub_f["Date Created"].dropna().dt.to_period("W").dt.start_time
-        ).size().cumsum().reset_index()
-        sc.columns = ["Week", "Cumulative Submittals"]
-        fig_trend.add_trace(go.Scatter(x=sc["Week"], y=sc["Cumulative Submittals"],
-                                        mode="lines+markers", name="Submittals",
-                                        line=dict(color=COLORS["accent"], width=2), marker=dict(size=5)))
-
-    if "Date Created" in df_rfi_f.columns and df_rfi_f["Date Created"].notna().any():
-        rc = df_rfi_f.dropna(subset=["Date Created"]).groupby(
-            df_rfi_f["Date Created"].dropna().dt.to_period("W").dt.start_time
-        ).size().cumsum().reset_index()
-        rc.columns = ["Week", "Cumulative RFIs"]
-        fig_trend.add_trace(go.Scatter(x=rc["Week"], y=rc["Cumulative RFIs"],
-                                        mode="lines+markers", name="RFIs",
-                                        line=dict(color=COLORS["accent2"], width=2), marker=dict(size=5)))
+    for label, cube, color in [("Submittals", sub_cube_f, COLORS["accent"]), ("RFIs", rfi_cube_f, COLORS["accent2"])]:
+        weekly = cube.counts(["Created Week"]).rename(columns={"Created Week": "Week"})
+        if not weekly.empty:
+            fig_trend.add_trace(go.Scatter(x=weekly["Week"], y=weekly["Count"].cumsum(),
+                                            mode="lines+markers", name=label,
+                                            line=dict(color=color, width=2), marker=dict(size=5)))
 
     fig_trend.update_layout(
         paper_bgcolor=COLORS["bg"], plot_bgcolor=COLORS["bg"], font=dict(color=COLORS["text"]),
@@ -895,14 +2557,14 @@ with col_y:
     exp_sub = df_sub_f.copy()
     if "Ball in Court (Names)" in exp_sub.columns:
         exp_sub = exp_sub.rename(columns={"Ball in Court (Names)": "Ball in Court (Employee)"})
-    drop_c = [c for c in ["Is Overdue", "Procore Overdue"] if c in exp_sub.columns]
+    drop_c = [c for c in ["Overdue Above", "Procore Overdue"] if c in exp_sub.columns]
     st.download_button("⬇️ Full Submittals CSV", exp_sub.drop(columns=drop_c).to_csv(index=False), "submittals_export.csv", "text/csv")
 
 with col_z:
     exp_rfi = df_rfi_f.copy()
     if "Ball in Court (Names)" in exp_rfi.columns:
         exp_rfi = exp_rfi.rename(columns={"Ball in Court (Names)": "Ball in Court (Employee)"})
-    drop_c = [c for c in ["Is Overdue", "Procore Overdue"] if c in exp_rfi.columns]
+    drop_c = [c for c in ["Overdue Above", "Procore Overdue"] if c in exp_rfi.columns]
     st.download_button("⬇️ Full RFIs CSV", exp_rfi.drop(columns=drop_c).to_csv(index=False), "rfis_export.csv", "text/csv")
 
 st.markdown(f"<p style='text-align:center; color:{COLORS['muted']}; margin-top:30px;'>API CPMC Project Dashboard | Bird Construction | Built with Streamlit</p>", unsafe_allow_html=True)